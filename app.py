@@ -1,30 +1,40 @@
 import os
+import json
+import secrets
 import subprocess
-import threading
 import shutil
-from flask import Flask, request, jsonify, render_template_string, send_from_directory
+from flask import Flask, Response, request, jsonify, render_template_string, send_from_directory
 from pathlib import Path
 import logging
+from urllib.parse import urlparse
 logging.getLogger('werkzeug').setLevel(logging.ERROR)
 
 app = Flask(__name__)
 
 BASE_DIR = Path(__file__).parent
 OUTPUT_DIR = BASE_DIR / "output"
-STATUS_FILE = BASE_DIR / "status.json"
 
-# ---------------- STATUS ----------------
+# ---------------- JOBS ----------------
 
-def write_status(message="Idle", progress=0, working=False):
-    STATUS_FILE.write_text(
-        f'{{"message":"{message}","progress":{progress},"working":{str(working).lower()}}}',
-        encoding="utf-8"
-    )
+# The Whisper worker unpickles what it receives, so its socket takes a random key per
+# launch (unless one is set); the worker started below inherits it from the environment
+os.environ.setdefault("CLIPGEN_WORKER_KEY", secrets.token_hex(32))
+
+from clipgen.config import MAX_CLIP_COUNT
+from clipgen.core.pipeline import load_manifest
+from clipgen.services.jobs import JobQueue
+from clipgen.services.metrics import prometheus_text
+from clipgen.services.render_cache import render_cache_stats
 
-def read_status():
-    if not STATUS_FILE.exists():
-        write_status()
-    return STATUS_FILE.read_text(encoding="utf-8")
+jobs = JobQueue()
+
+def current_status():
+    # Progress bar follows the newest running job, else the newest finished one
+    all_jobs = jobs.jobs()
+    job = next((j for j in all_jobs if j["working"]), all_jobs[0] if all_jobs else None)
+    if job is None:
+        return {"message": "Idle", "progress": 0, "working": False}
+    return {"message": job["message"], "progress": job["progress"], "working": job["working"]}
 
 # ---------------- MAIN PAGE ----------------
 
@@ -128,6 +138,13 @@ button:disabled {
     margin-top:40px;
 }
 
+.job {
+    font-size:13px;
+    padding:6px 0;
+    border-bottom:1px solid #eee;
+    color:#555;
+}
+
 .project-card {
     padding:15px;
     margin-bottom:10px;
@@ -183,6 +200,12 @@ button:disabled {
 <option value="no">Norsk</option>
 </select>
 
+<label>Kvalitet</label>
+<select name="tier">
+<option value="preview" selected>Forhåndsvisning (rask, full kvalitet per klipp etterpå)</option>
+<option value="final">Full kvalitet</option>
+</select>
+
 <button type="submit" id="startBtn">Start</button>
 </form>
 
@@ -192,6 +215,8 @@ button:disabled {
 
 <div id="statusText">Idle</div>
 
+<div id="jobs"></div>
+
 <div class="projects">
 <h3>Prosjekter</h3>
 {% for p in projects %}
@@ -210,8 +235,6 @@ button:disabled {
 const form = document.getElementById("clipForm");
 const btn = document.getElementById("startBtn");
 
-let polling = null;
-
 form.addEventListener("submit", async function(e){
     e.preventDefault();
     btn.disabled = true;
@@ -223,48 +246,35 @@ form.addEventListener("submit", async function(e){
         body:formData
     });
 
-    startPolling();
+    // Jobs are queued server-side, so another URL can be submitted right away
+    btn.disabled = false;
+    form.reset();
 });
 
-function startPolling(){
-    if (polling) return;
-    polling = setInterval(updateStatus, 1500);
-}
-
-function stopPolling(){
-    if (polling){
-        clearInterval(polling);
-        polling = null;
-    }
-}
-
-async function updateStatus(){
-    const res = await fetch("/status");
-    const data = await res.json();
-
+function showStatus(data){
     document.getElementById("statusText").innerText = data.message;
     document.getElementById("progressBar").style.width = data.progress + "%";
+}
 
-    if(!data.working){
-        btn.disabled = false;
-        stopPolling();
+function showJobs(list){
+    const el = document.getElementById("jobs");
+    el.innerHTML = "";
+    for (const j of list) {
+        const row = document.createElement("div");
+        row.className = "job";
+        const where = j.state === "queued" ? "i kø" : (j.state === "waiting" ? "venter på " + j.stage : j.stage);
+        row.innerText = j.url + " — " + where + " — " + j.message + " (" + j.progress + "%)";
+        el.appendChild(row);
     }
 }
 
-// 🔥 THIS IS THE FIX
-// Check status immediately when page loads
-window.addEventListener("load", async function(){
-    const res = await fetch("/status");
-    const data = await res.json();
-
-    document.getElementById("statusText").innerText = data.message;
-    document.getElementById("progressBar").style.width = data.progress + "%";
-
-    if(data.working){
-        btn.disabled = true;
-        startPolling();
-    }
-});
+// Server pushes a snapshot on every job change; EventSource reconnects by itself
+const events = new EventSource("/events");
+events.onmessage = function(e){
+    const data = JSON.parse(e.data);
+    showStatus(data.status);
+    showJobs(data.jobs);
+};
 </script>
 
 </body>
@@ -325,6 +335,24 @@ video {
     border-radius:8px;
     text-decoration:none;
 }
+
+.final-btn {
+    display:block;
+    width:100%;
+    margin-top:10px;
+    padding:8px;
+    background:#3f7fd8;
+    color:white;
+    border:none;
+    border-radius:8px;
+    font-weight:bold;
+    cursor:pointer;
+}
+
+.final-btn:disabled {
+    background:#aaa;
+    cursor:not-allowed;
+}
 </style>
 </head>
 <body>
@@ -333,16 +361,49 @@ video {
 <h2>{{project}}</h2>
 
 <div class="grid">
-{% for f in files %}
+{% for c in clips %}
 <div class="card">
-<video controls>
-<source src="/video/{{project}}/{{f}}" type="video/mp4">
+<video controls preload="metadata">
+<source src="/video/{{project}}/{{c.file}}" type="video/mp4">
 </video>
-<a class="download" href="/video/{{project}}/{{f}}" download>Last ned</a>
+{% if c.final %}
+<a class="download" href="/video/{{project}}/{{c.file}}" download>Last ned</a>
+{% else %}
+<button class="final-btn" data-clip="{{c.index}}">Render i full kvalitet</button>
+{% endif %}
 </div>
 {% endfor %}
 </div>
 
+<script>
+async function waitForJob(id){
+    while (true) {
+        await new Promise(r => setTimeout(r, 2000));
+        const job = await (await fetch("/jobs/" + id)).json();
+        if (!job.working) return job;
+    }
+}
+
+for (const btn of document.querySelectorAll(".final-btn")) {
+    btn.addEventListener("click", async function(){
+        btn.disabled = true;
+        btn.innerText = "I kø...";
+        const res = await fetch("/final/{{project}}/" + btn.dataset.clip, {method:"POST"});
+        if (!res.ok) {
+            btn.innerText = "Feil oppstod";
+            return;
+        }
+        btn.innerText = "Rendrer...";
+        const job = await waitForJob((await res.json()).id);
+        if (job.state === "done") {
+            location.reload();
+        } else {
+            btn.innerText = "Feil oppstod";
+        }
+    });
+}
+</script>
+
 </body>
 </html>
 """
@@ -361,40 +422,95 @@ def index():
 
 @app.route("/start", methods=["POST"])
 def start():
-    url = request.form.get("url")
-    clip_count = request.form.get("clip_count", "3")
+    url = (request.form.get("url") or "").strip()
+    if not url:
+        return jsonify({"error": "Ingen URL"}), 400
+    # Only web URLs: anything else could name a file on the server
+    parsed = urlparse(url)
+    if parsed.scheme not in ("http", "https") or not parsed.netloc:
+        return jsonify({"error": "Ugyldig URL"}), 400
+
+    try:
+        clip_count = int(request.form.get("clip_count", "3"))
+    except ValueError:
+        return jsonify({"error": "Ugyldig antall klipp"}), 400
+    clip_count = min(max(clip_count, 1), MAX_CLIP_COUNT)
     language = request.form.get("language", "auto")
+    tier = request.form.get("tier", "preview")
+    if tier not in ("preview", "final"):
+        return jsonify({"error": "Ukjent kvalitet"}), 400
 
-    write_status("Starter...", 5, True)
+    job = jobs.submit(url, clip_count, language, tier)
+    return jsonify(job.to_dict()), 202
 
-    def run():
-        try:
-            env = os.environ.copy()
-            env["CLIP_COUNT"] = clip_count
-            env["CLIP_LANGUAGE"] = language
 
-            process = subprocess.Popen(
-                [sys.executable, "-m", "clipgen.core.pipeline"],
-                stdin=subprocess.PIPE,
-                env=env
-            )
+@app.route("/final/<project>/<int:idx>", methods=["POST"])
+def render_final_clip(project, idx):
+    manifest = load_manifest(OUTPUT_DIR / project)
+    if manifest is None or not any(c["index"] == idx for c in manifest["clips"]):
+        return jsonify({"error": "Clip not found"}), 404
 
-            process.communicate(input=url.encode("utf-8"))
+    job = jobs.submit_final(project, idx)
+    return jsonify(job.to_dict()), 202
 
-            write_status("Ferdig!", 100, False)
 
-        except Exception as e:
-            print("ERROR:", e)
-            write_status("Feil oppstod", 0, False)
+@app.route("/status")
+def status():
+    return jsonify(current_status())
+
+
+@app.route("/events")
+def events():
+    def stream():
+        version = None
+        while True:
+            new_version = jobs.wait(version)
+            if new_version == version:
+                yield ": keepalive\n\n"
+                continue
+            version = new_version
+            payload = {
+                "status": current_status(),
+                "jobs": [j for j in jobs.jobs() if j["working"]],
+            }
+            yield f"data: {json.dumps(payload)}\n\n"
+
+    return Response(
+        stream(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
-    threading.Thread(target=run).start()
 
-    return "", 204
+@app.route("/jobs")
+def job_list():
+    return jsonify(jobs.jobs())
 
 
-@app.route("/status")
-def status():
-    return read_status(), 200, {"Content-Type": "application/json"}
+@app.route("/metrics")
+def metrics():
+    # Prometheus text format: per-stage totals since start, plus job and cache gauges
+    states = {}
+    for j in jobs.jobs():
+        states[j["state"]] = states.get(j["state"], 0) + 1
+    cache = render_cache_stats()
+    extra = [
+        ("clipgen_jobs", "gauge", "Jobs by state",
+         [({"state": k}, v) for k, v in sorted(states.items())]),
+        ("clipgen_render_cache_hits_total", "counter", "Render cache hits", [({}, cache["hits"])]),
+        ("clipgen_render_cache_misses_total", "counter", "Render cache misses", [({}, cache["misses"])]),
+        ("clipgen_render_cache_entries", "gauge", "Rendered clips in the cache", [({}, cache["entries"])]),
+        ("clipgen_render_cache_bytes", "gauge", "Size of the render cache", [({}, cache["bytes"])]),
+    ]
+    return Response(prometheus_text(extra), mimetype="text/plain; version=0.0.4")
+
+
+@app.route("/jobs/<job_id>")
+def job_detail(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job.to_dict())
 
 
 @app.route("/project/<project>")
@@ -403,12 +519,24 @@ def project(project):
     if not project_dir.exists():
         return "Project not found", 404
 
-    files = sorted([f.name for f in project_dir.glob("*.mp4")])
+    manifest = load_manifest(project_dir)
+    if manifest is None:
+        # Rendered in full quality straight away (or before previews existed)
+        clips = [
+            {"index": i, "file": f.name, "final": True}
+            for i, f in enumerate(sorted(project_dir.glob("*_clip_vertical_subs.mp4")), start=1)
+        ]
+    else:
+        # Show the final encode once it exists, else the preview
+        clips = []
+        for c in manifest["clips"]:
+            final = (project_dir / c["final"]).exists()
+            clips.append({"index": c["index"], "file": c["final"] if final else c["preview"], "final": final})
 
     return render_template_string(
         PROJECT_HTML,
         project=project,
-        files=files
+        clips=clips
     )
 
 
@@ -433,5 +561,7 @@ def delete_project(project):
 # ---------------- RUN ----------------
 
 if __name__ == "__main__":
-    write_status()
+    if os.getenv("CLIPGEN_WORKER", "1") == "1":
+        # Keep Whisper resident so jobs skip the model load
+        subprocess.Popen([sys.executable, "-m", "clipgen.services.whisper_worker"], cwd=str(BASE_DIR))
     app.run(host="0.0.0.0", port=5000)
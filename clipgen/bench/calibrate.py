@@ -0,0 +1,168 @@
+import argparse
+import json
+import os
+import platform
+import queue
+import sys
+import tempfile
+import time
+from multiprocessing import get_context
+from pathlib import Path
+
+import ctranslate2
+import numpy as np
+
+from clipgen.config import WHISPER_CALIBRATION_FILE
+from clipgen.core.audio import SAMPLE_RATE, decode_audio, load_audio
+from clipgen.core.transcriber import _segment_words
+from clipgen.services.utils import log
+from faster_whisper import WhisperModel
+
+MODELS = ("tiny", "base", "small", "medium")
+COMPUTE_TYPES = {"cpu": ("int8", "float32"), "cuda": ("float16", "int8_float16")}
+SAMPLE_SECONDS = 60
+# Past this many seconds per media second the larger models are not measured
+MAX_RTF = 2.0
+# Workers that have not all loaded their model by then give up
+_BARRIER_TIMEOUT = 900
+
+
+def cpu_layouts(cores: int):
+    # (workers, threads per worker) that fill every core: one process with all of them,
+    # down to one single-threaded process per core
+    threads = {cores} | {2 ** k for k in range(cores.bit_length()) if 2 ** k <= cores}
+    return [(w, cores // w) for w in sorted({cores // t for t in threads})]
+
+
+def _measure_worker(model_name, device, compute_type, threads, audio_path, n, language, barrier, results):
+    try:
+        t0 = time.perf_counter()
+        model = WhisperModel(model_name, device=device, compute_type=compute_type, cpu_threads=threads, num_workers=1)
+        load = time.perf_counter() - t0
+        audio = np.array(load_audio(audio_path)[:n])
+
+        # Workers transcribe at the same time, as chunked transcription runs them
+        barrier.wait(_BARRIER_TIMEOUT)
+        t0 = time.perf_counter()
+        segments, _ = model.transcribe(audio, language=language, word_timestamps=True)
+        words = sum(1 for _ in _segment_words(segments))
+        results.put({"load": load, "seconds": time.perf_counter() - t0, "words": words})
+    except Exception as e:
+        barrier.abort()
+        results.put({"error": str(e)})
+
+
+def measure(model_name, device, compute_type, workers, threads, audio_path: Path, n: int, language=None):
+    # Real-time factor of one setup: processing seconds per media second with `workers`
+    # processes transcribing the sample side by side. None if it fails to run.
+    ctx = get_context("spawn")
+    barrier = ctx.Barrier(workers)
+    results = ctx.Queue()
+    procs = [
+        ctx.Process(
+            target=_measure_worker,
+            args=(model_name, device, compute_type, threads, str(audio_path), n, language, barrier, results),
+        )
+        for _ in range(workers)
+    ]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+
+    runs = []
+    while True:
+        try:
+            runs.append(results.get_nowait())
+        except queue.Empty:
+            break
+    errors = [r["error"] for r in runs if "error" in r]
+    if errors or len(runs) < workers:
+        log(f"  {model_name} {device}/{compute_type} {workers}x{threads}: failed ({errors[0] if errors else 'worker died'})")
+        return None
+
+    sample_seconds = n / SAMPLE_RATE
+    return {
+        "model": model_name,
+        "device": device,
+        "compute_type": compute_type,
+        "workers": workers,
+        "threads": threads,
+        "load_seconds": round(max(r["load"] for r in runs), 3),
+        "rtf": round(max(r["seconds"] for r in runs) / (workers * sample_seconds), 5),
+        "words": runs[0]["words"],
+    }
+
+
+def _setups():
+    # (device, compute types, [(workers, threads), ...]) available on this host
+    setups = [("cpu", COMPUTE_TYPES["cpu"], cpu_layouts(os.cpu_count() or 1))]
+    if ctranslate2.get_cuda_device_count() > 0:
+        # threads 0: the library default; one process owns the GPU
+        setups.insert(0, ("cuda", COMPUTE_TYPES["cuda"], [(1, 0)]))
+    return setups
+
+
+def calibrate(media: Path, models=MODELS, seconds: float = SAMPLE_SECONDS, language=None):
+    results = []
+    with tempfile.TemporaryDirectory() as d:
+        # decode_audio writes beside its input; keep that out of the caller's directory
+        link = Path(d) / Path(media).name
+        link.symlink_to(Path(media).resolve())
+        audio_path = decode_audio(link)
+        n = min(len(load_audio(audio_path)), int(seconds * SAMPLE_RATE))
+        log(f"Calibrating on {n / SAMPLE_RATE:.0f}s of {Path(media).name}")
+
+        for device, compute_types, layouts in _setups():
+            for compute_type in compute_types:
+                for workers, threads in layouts:
+                    # Smallest model first: once one is too slow, the larger ones are too
+                    for model_name in models:
+                        r = measure(model_name, device, compute_type, workers, threads, audio_path, n, language)
+                        if r is None:
+                            break
+                        results.append(r)
+                        log(
+                            f"  {model_name:<9} {device}/{compute_type:<12} {workers}x{threads:<3} "
+                            f"rtf {r['rtf']:.3f}, load {r['load_seconds']:.1f}s"
+                        )
+                        if r["rtf"] > MAX_RTF:
+                            break
+
+    return {
+        "host": platform.node(),
+        "cpu_count": os.cpu_count(),
+        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "sample_seconds": round(n / SAMPLE_RATE, 3),
+        "results": results,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m clipgen.bench.calibrate",
+        description="Measure Whisper speed on this host so jobs can pick a model that meets TRANSCRIBE_DEADLINE.",
+    )
+    parser.add_argument("media", type=Path, help="a representative video or audio file with speech")
+    parser.add_argument("--models", nargs="*", default=list(MODELS))
+    parser.add_argument("--seconds", type=float, default=SAMPLE_SECONDS, help="length of the sample transcribed")
+    parser.add_argument("--language", default="auto")
+    parser.add_argument("--out", type=Path, default=WHISPER_CALIBRATION_FILE)
+    args = parser.parse_args(argv)
+
+    language = None if args.language == "auto" else args.language
+    data = calibrate(args.media, args.models, args.seconds, language)
+    if not data["results"]:
+        log("No setup could be measured; calibration not saved.")
+        return 1
+
+    tmp = args.out.with_suffix(f".tmp{os.getpid()}")
+    tmp.write_text(json.dumps(data, indent=2), encoding="utf-8")
+    os.replace(tmp, args.out)
+    log(f"Saved {len(data['results'])} setup(s) to {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    # python -m clipgen.bench.calibrate sample.mp4 [--models tiny base small] [--seconds 60]
+    sys.exit(main())
@@ -0,0 +1,129 @@
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from clipgen.core.keyframes import keyframe_index
+from clipgen.core.renderer import cut_source, ffmpeg_render, ffmpeg_render_batch
+from clipgen.core.subtitles import generate_ass_for_range
+from clipgen.services.render_cache import render_cache_disabled
+from clipgen.services.utils import log
+
+CLIP_LEN = 36
+CLIP_STEP = 45
+FPS = 30
+
+
+def make_source(path: Path, duration: float, gop: int = 60):
+    # gop: frames between keyframes; VODs often run 10 s or more
+    cmd = [
+        "ffmpeg", "-y",
+        "-f", "lavfi", "-i", f"testsrc2=size=1280x720:rate={FPS}:duration={duration}",
+        "-f", "lavfi", "-i", f"sine=frequency=440:sample_rate=44100:duration={duration}",
+        "-c:v", "libx264", "-preset", "ultrafast", "-g", str(gop), "-keyint_min", str(gop), "-sc_threshold", "0",
+        "-c:a", "aac", "-shortest",
+        str(path),
+    ]
+    subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+
+
+def make_clips(tmp: Path, count: int, tag: str):
+    words = [
+        {"start": t * 0.5, "end": t * 0.5 + 0.4, "text": f"word{t}"}
+        for t in range(int((count * CLIP_STEP + CLIP_LEN) * 2))
+    ]
+    clips = []
+    for i in range(count):
+        start = i * CLIP_STEP
+        end = start + CLIP_LEN
+        ass_file = tmp / f"{tag}_{i:02d}.ass"
+        generate_ass_for_range(words, start, end, ass_file)
+        clips.append((start, end, ass_file, tmp / f"{tag}_{i:02d}.mp4"))
+    return clips
+
+
+def bench(counts=(3, 5, 20)):
+    results = []
+    with tempfile.TemporaryDirectory() as d, render_cache_disabled():
+        tmp = Path(d)
+        source = tmp / "source.mp4"
+        make_source(source, max(counts) * CLIP_STEP + CLIP_LEN)
+
+        for n in counts:
+            clips = make_clips(tmp, n, f"loop{n}")
+            t0 = time.perf_counter()
+            for clip in clips:
+                ffmpeg_render(source, *clip)
+            loop_s = time.perf_counter() - t0
+
+            clips = make_clips(tmp, n, f"batch{n}")
+            t0 = time.perf_counter()
+            ffmpeg_render_batch(source, clips)
+            batch_s = time.perf_counter() - t0
+
+            results.append({"clips": n, "loop_seconds": round(loop_s, 2), "batch_seconds": round(batch_s, 2)})
+            log(f"{n:>3} clips: loop {loop_s:.1f}s, batch {batch_s:.1f}s ({loop_s / batch_s:.2f}x)")
+
+    return results
+
+
+def bench_seek(duration: float = 3600, count: int = 5, gop: int = 300):
+    # Per-clip cost of the lead-in decode from the preceding keyframe: equal-length
+    # clips starting just after ("early") and just before ("late") a keyframe,
+    # plus the stream-copied keyframe-aligned cut kept for final renders
+    gop_s = gop / FPS
+    with tempfile.TemporaryDirectory() as d, render_cache_disabled():
+        tmp = Path(d)
+        source = tmp / "source.mp4"
+        make_source(source, duration, gop)
+
+        t0 = time.perf_counter()
+        keyframes = keyframe_index(source)
+        index_s = time.perf_counter() - t0
+
+        words = [{"start": t * 0.5, "end": t * 0.5 + 0.4, "text": f"word{t}"} for t in range(int(duration * 2))]
+        step = (duration - CLIP_LEN - gop_s) / count
+        base = [int(i * step / gop_s) * gop_s for i in range(count)]
+
+        timings = {}
+        for mode, lead in (("early", 0.05), ("late", 0.95)):
+            times = []
+            for i, k in enumerate(base):
+                start = k + lead * gop_s
+                end = start + CLIP_LEN
+                ass_file = tmp / f"{mode}_{i:02d}.ass"
+                generate_ass_for_range(words, start, end, ass_file)
+                t0 = time.perf_counter()
+                ffmpeg_render(source, start, end, ass_file, tmp / f"{mode}_{i:02d}.mp4")
+                times.append(time.perf_counter() - t0)
+            timings[mode] = round(sum(times) / len(times), 3)
+            log(f"{mode:>6}: {timings[mode]:.2f}s per clip")
+
+        times = []
+        for i, k in enumerate(base):
+            start = k + 0.95 * gop_s
+            t0 = time.perf_counter()
+            cut_source(source, start, start + CLIP_LEN, tmp / f"cut_{i:02d}.mp4", keyframes)
+            times.append(time.perf_counter() - t0)
+        timings["copy_cut"] = round(sum(times) / len(times), 3)
+        log(f"   cut: {timings['copy_cut']:.2f}s per clip")
+
+    return {
+        "duration": duration,
+        "gop_seconds": gop_s,
+        "keyframes": len(keyframes),
+        "index_seconds": round(index_s, 3),
+        "per_clip_seconds": timings,
+    }
+
+
+if __name__ == "__main__":
+    # python -m clipgen.bench.render [3 5 20]
+    # python -m clipgen.bench.render seek [duration_seconds]
+    if len(sys.argv) > 1 and sys.argv[1] == "seek":
+        print(json.dumps(bench_seek(float(sys.argv[2]) if len(sys.argv) > 2 else 3600), indent=2))
+    else:
+        counts = tuple(int(a) for a in sys.argv[1:]) or (3, 5, 20)
+        print(json.dumps(bench(counts), indent=2))
@@ -0,0 +1,228 @@
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from clipgen.config import CACHE_DIR
+from clipgen.core.audio import decode_audio, load_audio
+from clipgen.core.renderer import ffmpeg_render, ffmpeg_render_batch
+from clipgen.core.scoring import score_blocks
+from clipgen.core.segmenter import build_blocks, words_to_sentences
+from clipgen.core.selector import select_clips
+from clipgen.core.subtitles import generate_ass_for_range
+from clipgen.core.words import WordStore
+from clipgen.services.render_cache import render_cache_disabled
+from clipgen.services.utils import log
+
+WORD_COUNTS = (1_000, 10_000, 100_000, 1_000_000)
+MEDIA_SECONDS = (60, 600, 3600, 10800)
+QUICK_WORD_COUNTS = (1_000, 10_000, 100_000)
+QUICK_MEDIA_SECONDS = (60,)
+
+# Generated sources are reused between runs; only the stages are timed
+MEDIA_DIR = CACHE_DIR / "bench"
+CLIP_LEN = 36
+RENDER_CLIPS = 3
+SELECT_CLIPS = 10
+
+_VOCAB = [
+    "the", "and", "we", "you", "really", "think", "video", "going", "about", "that",
+    "actually", "something", "people", "right", "because", "interesting", "so", "is",
+]
+
+
+def make_words(n: int, seed: int = 0):
+    # Word-timed transcript: ~0.35 s per word, short pauses, a sentence every 6-20 words
+    rng = random.Random(seed)
+    words = []
+    t = 0.0
+    until_stop = rng.randint(6, 20)
+    for _ in range(n):
+        dur = rng.uniform(0.15, 0.45)
+        until_stop -= 1
+        text = rng.choice(_VOCAB)
+        if until_stop == 0:
+            text += rng.choice((".", ".", "!", "?"))
+            until_stop = rng.randint(6, 20)
+        words.append({"start": round(t, 3), "end": round(t + dur, 3), "text": text})
+        t += dur + (rng.uniform(0.3, 1.2) if text[-1] in ".!?" else rng.uniform(0.0, 0.12))
+    return words
+
+
+def make_media(duration: int) -> Path:
+    # Test pattern plus pink noise, small and fast to encode; cached by duration
+    path = MEDIA_DIR / f"lavfi_{duration}s.mp4"
+    if path.exists():
+        return path
+
+    MEDIA_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp.mp4")
+    cmd = [
+        "ffmpeg", "-y",
+        "-f", "lavfi", "-i", f"testsrc2=size=640x360:rate=25:duration={duration}",
+        "-f", "lavfi", "-i", f"anoisesrc=color=pink:amplitude=0.2:sample_rate=44100:duration={duration}",
+        "-c:v", "libx264", "-preset", "ultrafast", "-g", "50",
+        "-c:a", "aac", "-shortest",
+        str(tmp),
+    ]
+    log(f"Generating {duration}s lavfi source...")
+    subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+    os.replace(tmp, path)
+    return path
+
+
+def _timed(fn, repeat: int = 1):
+    # Best of `repeat` runs; returns (seconds, result of the last run)
+    best = None
+    result = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        dt = time.perf_counter() - t0
+        best = dt if best is None else min(best, dt)
+    return round(best, 6), result
+
+
+def bench_text(n: int, tmp: Path):
+    # The stages between transcription and rendering, as run_job() runs them
+    raw = make_words(n)
+    repeat = 3 if n <= 100_000 else 1
+    r = {}
+
+    r["word_store"], words = _timed(lambda: WordStore.from_words(raw), repeat)
+    r["words_to_sentences"], sentences = _timed(lambda: words_to_sentences(words), repeat)
+    r["build_blocks"], blocks = _timed(lambda: build_blocks(sentences, 3), repeat)
+
+    def select():
+        scores = score_blocks(blocks.starts, blocks.ends, words)
+        return select_clips(blocks.starts, blocks.ends, SELECT_CLIPS, min_distance=45, scores=scores)
+
+    r["select"], picked = _timed(select, repeat)
+
+    def subtitles():
+        for k, i in enumerate(picked):
+            generate_ass_for_range(words, blocks.starts[i] - 3, blocks.ends[i] + 3, tmp / f"w{n}_{k:02d}.ass")
+
+    r["generate_ass"], _ = _timed(subtitles, repeat)
+    r["total"] = round(sum(r.values()), 6)
+    return r
+
+
+def bench_media(duration: int, tmp: Path):
+    source = make_media(duration)
+    # Link into the scratch dir: decode_audio writes beside its input and would reuse old output
+    video = tmp / f"src_{duration}.mp4"
+    if not video.exists():
+        try:
+            os.link(source, video)
+        except OSError:
+            shutil.copyfile(source, video)
+
+    words = WordStore.from_words(make_words(int(duration / 0.45)))
+    blocks = build_blocks(words_to_sentences(words), 3)
+    step = (duration - CLIP_LEN) / RENDER_CLIPS
+    clips = []
+    for k in range(RENDER_CLIPS):
+        start = round(k * step, 3)
+        end = start + CLIP_LEN
+        ass_file = tmp / f"m{duration}_{k:02d}.ass"
+        generate_ass_for_range(words, start, end, ass_file)
+        clips.append((start, end, ass_file, tmp / f"m{duration}_{k:02d}.mp4"))
+
+    r = {}
+    r["decode_audio"], audio_path = _timed(lambda: decode_audio(video))
+    # Block scoring with the audio features, over a transcript as long as the source
+    r["score_audio"], _ = _timed(lambda: score_blocks(blocks.starts, blocks.ends, words, load_audio(audio_path)))
+
+    t0 = time.perf_counter()
+    for start, end, ass_file, out in clips:
+        ffmpeg_render(video, start, end, ass_file, out)
+    r["ffmpeg_render_per_clip"] = round((time.perf_counter() - t0) / len(clips), 4)
+
+    batch = [(s, e, a, o.with_name("batch_" + o.name)) for s, e, a, o in clips]
+    r["ffmpeg_render_batch"], _ = _timed(lambda: ffmpeg_render_batch(video, batch))
+    r["total"] = round(r["decode_audio"] + r["score_audio"] + r["ffmpeg_render_batch"], 4)
+    return r
+
+
+def _commit():
+    try:
+        res = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=Path(__file__).parent)
+        return res.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run_suite(word_counts=WORD_COUNTS, media_seconds=MEDIA_SECONDS):
+    results = {
+        "commit": _commit(),
+        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "words": {},
+        "media": {},
+    }
+
+    # Scratch space beside the cached sources, so they can be hardlinked rather than copied
+    MEDIA_DIR.mkdir(parents=True, exist_ok=True)
+    with tempfile.TemporaryDirectory(dir=MEDIA_DIR) as d, render_cache_disabled():
+        tmp = Path(d)
+        for n in word_counts:
+            results["words"][str(n)] = r = bench_text(n, tmp)
+            log(f"{n:>9} words: " + ", ".join(f"{k} {v:.3f}s" for k, v in r.items()))
+        for sec in media_seconds:
+            results["media"][str(sec)] = r = bench_media(sec, tmp)
+            log(f"{sec:>7}s media: " + ", ".join(f"{k} {v:.2f}s" for k, v in r.items()))
+
+    return results
+
+
+def compare(old, new):
+    # Ratio new/old per timing; > 1 is slower
+    rows = []
+    for section in ("words", "media"):
+        for size, timings in new.get(section, {}).items():
+            before = old.get(section, {}).get(size, {})
+            for name, secs in timings.items():
+                if before.get(name):
+                    rows.append((f"{section}/{size}/{name}", before[name], secs, secs / before[name]))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m clipgen.bench.suite")
+    parser.add_argument("--quick", action="store_true", help="up to 100k words and a 1 min source")
+    parser.add_argument("--words", type=int, nargs="*", help="word list sizes")
+    parser.add_argument("--media", type=int, nargs="*", help="source lengths in seconds")
+    parser.add_argument("--out", type=Path, help="write results JSON here")
+    parser.add_argument("--compare", type=Path, help="earlier results JSON to compare against")
+    args = parser.parse_args(argv)
+
+    word_counts = args.words if args.words is not None else (QUICK_WORD_COUNTS if args.quick else WORD_COUNTS)
+    media_seconds = args.media if args.media is not None else (QUICK_MEDIA_SECONDS if args.quick else MEDIA_SECONDS)
+
+    results = run_suite(word_counts, media_seconds)
+    text = json.dumps(results, indent=2)
+    if args.out:
+        args.out.write_text(text, encoding="utf-8")
+    else:
+        print(text)
+
+    if args.compare:
+        old = json.loads(args.compare.read_text(encoding="utf-8"))
+        log(f"Compared with {old.get('commit') or args.compare.name}:")
+        for name, before, after, ratio in compare(old, results):
+            log(f"  {name:<45} {before:>9.4f}s -> {after:>9.4f}s  {ratio:5.2f}x")
+
+
+if __name__ == "__main__":
+    # python -m clipgen.bench.suite [--quick] [--out results.json] [--compare old.json]
+    sys.exit(main())
@@ -10,10 +10,101 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 WORK_DIR = BASE_DIR / "work"
 OUTPUT_DIR = BASE_DIR / "output"
 STATUS_FILE = BASE_DIR / "status.json"
+CACHE_DIR = BASE_DIR / "cache"
 
 WORK_DIR.mkdir(exist_ok=True)
 OUTPUT_DIR.mkdir(exist_ok=True)
+CACHE_DIR.mkdir(exist_ok=True)
 
 VERT_W = 720
 VERT_H = 1280
 SUB_MARGIN_V = 180
+
+WHISPER_MODEL = os.getenv("WHISPER_MODEL", "base")
+# "cuda" / "cpu" forces a device; otherwise the last working probe is reused
+WHISPER_DEVICE = os.getenv("WHISPER_DEVICE", "")
+WHISPER_DEVICE_FILE = WORK_DIR / "whisper_device.json"
+# Chunked CPU transcription: the decoded audio is cut at quiet points and the chunks are
+# transcribed by this many worker processes (0: one model over the whole file)
+TRANSCRIBE_WORKERS = int(os.getenv("TRANSCRIBE_WORKERS", "0"))
+# Model threads per worker; workers x threads should not exceed the core count
+TRANSCRIBE_THREADS = int(os.getenv("TRANSCRIBE_THREADS", "0")) or max(
+    1, (os.cpu_count() or 1) // max(1, TRANSCRIBE_WORKERS)
+)
+# Upper bound on chunk length (s); long media gets more chunks than workers
+TRANSCRIBE_CHUNK_SECONDS = float(os.getenv("TRANSCRIBE_CHUNK_SECONDS", "300"))
+# Measured speed of Whisper setups on this host, from python -m clipgen.bench.calibrate
+WHISPER_CALIBRATION_FILE = WORK_DIR / "whisper_calibration.json"
+# metrics.json of jobs that failed before they had a project dir (probe, download)
+FAILED_METRICS_DIR = WORK_DIR / "failed"
+# With a calibration, each job uses the most accurate setup expected to transcribe its
+# media within this many seconds (0: always WHISPER_MODEL)
+TRANSCRIBE_DEADLINE = float(os.getenv("TRANSCRIBE_DEADLINE", "600"))
+
+WORKER_HOST = "127.0.0.1"
+WORKER_PORT = int(os.getenv("CLIPGEN_WORKER_PORT", "8765"))
+# Set by app.py for each launch; without one the worker refuses to start and jobs
+# transcribe in-process
+WORKER_AUTHKEY = os.getenv("CLIPGEN_WORKER_KEY", "").encode("utf-8") or None
+
+TRANSCRIPT_CACHE_DIR = CACHE_DIR / "transcripts"
+SCENE_CACHE_DIR = CACHE_DIR / "scenes"
+KEYFRAME_CACHE_DIR = CACHE_DIR / "keyframes"
+TRANSCRIPT_CACHE_MAX_BYTES = int(os.getenv("TRANSCRIPT_CACHE_MB", "200")) * 1024 * 1024
+RENDER_CACHE_DIR = CACHE_DIR / "renders"
+# Rendered clips kept for reuse, least recently used evicted first (0 disables)
+RENDER_CACHE_MAX_BYTES = int(os.getenv("RENDER_CACHE_MB", "2048")) * 1024 * 1024
+
+# Clips closer than this (seconds) share one ffmpeg decode in ffmpeg_render_batch
+RENDER_BATCH_MAX_GAP = float(os.getenv("RENDER_BATCH_MAX_GAP", "30"))
+# Concurrent ffmpeg processes; the encoder thread budget is split between them
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+# Encode tiers: "preview" is a small, fast encode for browsing in the web UI,
+# "final" the full-size encode (fps 0 keeps the source frame rate)
+RENDER_TIERS = {
+    "preview": {"width": VERT_W // 2, "height": VERT_H // 2, "fps": 15, "preset": "ultrafast", "crf": 32},
+    "final": {
+        "width": VERT_W,
+        "height": VERT_H,
+        "fps": 0,
+        "preset": os.getenv("FINAL_PRESET", "veryfast"),
+        "crf": int(os.getenv("FINAL_CRF", "20")),
+    },
+}
+# Tier run_job() renders when none is given; the web form defaults to "preview"
+RENDER_TIER = os.getenv("CLIP_TIER", "final")
+# Upper bound on clips per job from the web form or a batch manifest
+MAX_CLIP_COUNT = 10
+# An ffmpeg run still going after RENDER_TIMEOUT_BASE + RENDER_TIMEOUT_FACTOR x the
+# media seconds it covers is taken as hung and killed
+RENDER_TIMEOUT_BASE = float(os.getenv("RENDER_TIMEOUT_BASE", "120"))
+RENDER_TIMEOUT_FACTOR = float(os.getenv("RENDER_TIMEOUT_FACTOR", "10"))
+
+# Point at a stand-in script to run without network access
+YTDLP = os.getenv("YTDLP_BIN", "yt-dlp")
+# Probed metadata and downloaded media, by video id
+VIDEO_CACHE_DIR = CACHE_DIR / "videos"
+VIDEO_CACHE_MAX_BYTES = int(float(os.getenv("VIDEO_CACHE_GB", "20")) * 1024 ** 3)
+# Stream URLs in a probe stay usable this long (s); older probes are re-extracted on download
+VIDEO_INFO_TTL = float(os.getenv("VIDEO_INFO_TTL", str(4 * 3600)))
+# A transfer with no new bytes for this long (s) is killed and resumed, up to DOWNLOAD_RETRIES runs
+DOWNLOAD_STALL_TIMEOUT = float(os.getenv("DOWNLOAD_STALL_TIMEOUT", "60"))
+DOWNLOAD_RETRIES = int(os.getenv("DOWNLOAD_RETRIES", "3"))
+# "full": download the whole video first; "audio": audio-only stream first,
+# then only the selected video sections
+INGEST_MODE = os.getenv("CLIP_INGEST", "full")
+# "1": select and render clips while transcription is still running. With CLIP_SCORING
+# each clip is the best block of its 1/clip_count of the video, not the best overall
+STREAMING = os.getenv("CLIP_STREAMING", "0") == "1"
+
+# Web job scheduler: jobs in flight, and how many may be in each stage at once
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+STAGE_LIMITS = {
+    "download": int(os.getenv("LIMIT_DOWNLOAD", "2")),
+    "transcribe": int(os.getenv("LIMIT_TRANSCRIBE", "1")),
+    "render": int(os.getenv("LIMIT_RENDER", "1")),
+}
+# "1": rank candidate blocks by audio energy and speech rate before selection
+SCORING = os.getenv("CLIP_SCORING", "1") == "1"
+# Snap padded clip edges to a scene cut at most this many seconds further out (0 disables)
+SCENE_SNAP_TOLERANCE = float(os.getenv("SCENE_SNAP_TOLERANCE", "2"))
@@ -0,0 +1,74 @@
+import os
+import struct
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+from clipgen.services.metrics import run_child
+from clipgen.services.utils import log
+
+SAMPLE_RATE = 16000
+
+# Fixed-size .npy header so the shape can be patched in after streaming
+_HEADER_LEN = 128
+
+
+def _npy_header(n: int) -> bytes:
+    header = "{'descr': '<f4', 'fortran_order': False, 'shape': (%d,), }" % n
+    header = header.ljust(_HEADER_LEN - 10 - 1) + "\n"
+    return b"\x93NUMPY\x01\x00" + struct.pack("<H", len(header)) + header.encode("latin1")
+
+
+def audio_path_for(video_path: Path) -> Path:
+    video_path = Path(video_path)
+    return video_path.with_name(f"{video_path.stem}.audio.npy")
+
+
+def decode_audio(video_path: Path) -> Path:
+    out_path = audio_path_for(video_path)
+    if out_path.exists() and out_path.stat().st_mtime >= Path(video_path).stat().st_mtime:
+        return out_path
+
+    cmd = [
+        "ffmpeg",
+        "-nostdin",
+        "-i",
+        str(video_path),
+        "-vn",
+        "-ac",
+        "1",
+        "-ar",
+        str(SAMPLE_RATE),
+        "-f",
+        "f32le",
+        "-",
+    ]
+
+    # Unique per decode: two jobs on the same media must not write into one file
+    with tempfile.NamedTemporaryFile(dir=out_path.parent, prefix=f"{out_path.stem}.", suffix=".tmp", delete=False) as f:
+        tmp = Path(f.name)
+        f.write(_npy_header(0))
+        f.flush()
+        # ffmpeg appends raw samples straight after the header
+        res = run_child(cmd, "ffmpeg_decode", stdout=f)
+        if res.returncode != 0:
+            f.close()
+            tmp.unlink(missing_ok=True)
+            err = (res.stderr or "Unknown ffmpeg error")[-1200:]
+            raise RuntimeError(f"ffmpeg audio decode failed:\n{err}")
+
+        n = (os.fstat(f.fileno()).st_size - _HEADER_LEN) // 4
+        f.seek(0)
+        f.write(_npy_header(n))
+
+    os.replace(tmp, out_path)
+    log(f"Decoded audio: {n / SAMPLE_RATE:.0f}s at {SAMPLE_RATE} Hz -> {out_path.name}")
+    return out_path
+
+
+def load_audio(audio) -> np.ndarray:
+    # Memory-mapped: long videos are paged from disk instead of held in RAM
+    if isinstance(audio, np.ndarray):
+        return audio
+    return np.load(str(audio), mmap_mode="r")
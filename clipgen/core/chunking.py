@@ -0,0 +1,85 @@
+import math
+
+import numpy as np
+
+from clipgen.core.audio import SAMPLE_RATE
+
+# Audio either side of a cut that both neighbouring chunks hear, so a word at the cut is complete in one
+CHUNK_OVERLAP = 1.0
+# Cut points are placed on the quietest 30 ms frame near their target
+_FRAME = int(0.03 * SAMPLE_RATE)
+# Across a seam, the later chunk may time a repeated word up to this much (s) after the earlier one
+_REPEAT_DRIFT = 0.15
+
+
+def chunk_count(duration: float, workers: int, chunk_seconds: float) -> int:
+    # At least one chunk per worker, and whole rounds so no worker idles at the end
+    n = max(workers, math.ceil(duration / chunk_seconds))
+    return math.ceil(n / workers) * workers
+
+
+def split_points(audio, n_chunks: int, search_seconds: float = 10.0):
+    # Sample positions [0, ..., len(audio)] splitting audio into n_chunks of about equal
+    # length, each inner cut moved to the quietest frame within search_seconds of its target
+    n = len(audio)
+    search = int(search_seconds * SAMPLE_RATE)
+    cuts = [0]
+    for k in range(1, n_chunks):
+        target = n * k // n_chunks
+        lo = max(cuts[-1] + _FRAME, target - search)
+        hi = min(n - _FRAME, target + search)
+        if hi - lo < _FRAME:
+            continue
+
+        window = np.asarray(audio[lo:hi], dtype=np.float32)
+        frames = window[: len(window) // _FRAME * _FRAME].reshape(-1, _FRAME)
+        energy = np.square(frames).mean(axis=1)
+        # Among frames about as quiet as the quietest, the one nearest the target
+        quiet = np.flatnonzero(energy <= energy.min() * 1.5 + 1e-10)
+        centers = lo + quiet * _FRAME + _FRAME // 2
+        cuts.append(int(centers[np.argmin(np.abs(centers - target))]))
+    cuts.append(n)
+    return cuts
+
+
+def chunk_spans(cuts, n_samples: int, overlap: float = CHUNK_OVERLAP):
+    # [(first sample, end sample, lo, hi), ...]: the audio a chunk transcribes, padded
+    # by overlap seconds, and the span [lo, hi) in seconds whose words it owns
+    pad = int(overlap * SAMPLE_RATE)
+    spans = []
+    for lo, hi in zip(cuts, cuts[1:]):
+        spans.append((max(0, lo - pad), min(n_samples, hi + pad), lo / SAMPLE_RATE, hi / SAMPLE_RATE))
+    return spans
+
+
+def _norm(text: str) -> str:
+    return "".join(ch for ch in text.lower() if ch.isalnum())
+
+
+def _repeats(tail, start: float, end: float, text: str) -> bool:
+    # Same word as one the previous chunk kept, timed within the drift the two chunks can disagree by
+    key = _norm(text)
+    return any(_norm(p["text"]) == key and start < p["end"] + _REPEAT_DRIFT and end > p["start"] for p in tail)
+
+
+def stitch_chunks(chunks, tolerance: float = 0.05):
+    # chunks: [(offset, lo, hi, words), ...] in timeline order, words with chunk-relative
+    # times. Returns one word list on the global timeline. Around a cut both chunks heard
+    # the same audio: the earlier chunk keeps words whose midpoint falls before its hi,
+    # the later one continues from the end of the last kept word (a word cut off at the
+    # padded chunk start sits mostly inside it), and a word that repeats one kept just
+    # before the seam is dropped.
+    out = []
+    for offset, lo, hi, words in chunks:
+        last_end = out[-1]["end"] if out else -math.inf
+        tail = out[-3:]
+        for w in words:
+            start = round(w["start"] + offset, 3)
+            end = round(w["end"] + offset, 3)
+            mid = (start + end) / 2
+            if mid >= hi:
+                continue
+            if start < last_end - tolerance or mid < last_end or _repeats(tail, start, end, w["text"]):
+                continue
+            out.append({**w, "start": start, "end": end})
+    return out
@@ -1,29 +1,231 @@
+import os
+import shutil
 import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 
-from clipgen.config import WORK_DIR
+from clipgen.config import DOWNLOAD_RETRIES, DOWNLOAD_STALL_TIMEOUT, WORK_DIR, YTDLP
+from clipgen.services.metrics import carry_metrics, child_peak_rss, record_child, wait_child
 from clipgen.services.status_service import update_status
-from clipgen.services.utils import get_youtube_title, safe_name, unique_project_dir
+from clipgen.services.utils import log, safe_name, unique_project_dir
+from clipgen.services.video_info import evict_media, probe_video, source_args, video_dir, video_lock
 
 
-def download_youtube(url: str):
+# One machine-readable line per progress tick: status, bytes done, total, estimate, speed, eta
+_PROGRESS_PREFIX = "[clipgen-progress]"
+_PROGRESS_TEMPLATE = (
+    f"download:{_PROGRESS_PREFIX} %(progress.status)s %(progress.downloaded_bytes)s "
+    "%(progress.total_bytes)s %(progress.total_bytes_estimate)s %(progress.speed)s %(progress.eta)s"
+)
+
+
+class _Stalled(Exception):
+    pass
+
+
+def _num(field: str):
+    try:
+        return float(field)
+    except ValueError:
+        return None  # "NA" while yt-dlp does not know yet
+
+
+def _fmt_bytes(n: float) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if n < 1024 or unit == "GB":
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024
+
+
+def _read_output(proc, state):
+    # Reader thread: yt-dlp runs with stderr folded into stdout
+    for line in proc.stdout:
+        line = line.rstrip()
+        if not line.startswith(_PROGRESS_PREFIX):
+            state["tail"].append(line)
+            del state["tail"][:-20]
+            continue
+
+        fields = line[len(_PROGRESS_PREFIX):].split()
+        if len(fields) < 6:
+            continue
+        done = _num(fields[1]) or 0
+        # The stall clock starts when a transfer starts, not when yt-dlp was launched:
+        # extraction can take longer than the timeout and the first tick may report 0 bytes
+        if fields[0] != state["status"] or done > state["done"]:
+            state["active"] = time.monotonic()
+        state.update(
+            status=fields[0],
+            done=done,
+            total=_num(fields[2]) or _num(fields[3]),
+            speed=_num(fields[4]),
+            eta=_num(fields[5]),
+        )
+
+
+def _run_yt_dlp(args, out_path, label, progress):
+    cmd = [
+        YTDLP,
+        *args,
+        "--newline",
+        "--progress-template",
+        _PROGRESS_TEMPLATE,
+        "--socket-timeout",
+        "30",
+        "-o",
+        str(out_path),
+    ]
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, errors="replace")
+    state = {"status": None, "done": 0, "total": None, "speed": None, "eta": None,
+             "active": time.monotonic(), "tail": []}
+    reader = threading.Thread(target=_read_output, args=(proc, state), daemon=True)
+    reader.start()
+
+    lo, hi = progress or (None, None)
+    peak = None
+    while True:
+        try:
+            rusage = wait_child(proc, timeout=0.5)
+            break
+        except subprocess.TimeoutExpired:
+            peak = child_peak_rss(proc.pid) or peak
+
+        # Only a transfer can stall: extraction and post-processing print no progress
+        if state["status"] == "downloading" and time.monotonic() - state["active"] > DOWNLOAD_STALL_TIMEOUT:
+            proc.kill()
+            record_child("yt-dlp", time.perf_counter() - t0, wait_child(proc), peak_rss=peak, stalled=True)
+            raise _Stalled(f"no data for {DOWNLOAD_STALL_TIMEOUT:.0f}s at {_fmt_bytes(state['done'])}")
+
+        if progress and state["total"]:
+            frac = min(1.0, state["done"] / state["total"])
+            msg = f"{label} {frac:.0%} av {_fmt_bytes(state['total'])}"
+            if state["speed"]:
+                msg += f", {_fmt_bytes(state['speed'])}/s"
+            if state["eta"] is not None:
+                msg += f", {int(state['eta']) // 60}:{int(state['eta']) % 60:02d} igjen"
+            update_status(msg, int(lo + (hi - lo) * frac), True)
+
+    record_child("yt-dlp", time.perf_counter() - t0, rusage, peak_rss=peak)
+    reader.join(timeout=5)
+    return proc.returncode, "\n".join(state["tail"])
+
+
+def _yt_dlp(args, out_path, label: str = "Laster ned...", progress=None):
+    # progress: (lo, hi) status percentages to spread the transfer over.
+    # Only the finished file is removed up front: yt-dlp resumes from out_path + ".part",
+    # so a stalled or interrupted transfer continues where it stopped.
+    if out_path.exists():
+        out_path.unlink()
+
+    err = ""
+    for attempt in range(1, DOWNLOAD_RETRIES + 1):
+        try:
+            code, err = _run_yt_dlp(args, out_path, label, progress)
+        except _Stalled as e:
+            err = f"download stalled: {e}"
+            if attempt < DOWNLOAD_RETRIES:
+                log(f"Download stalled ({e}); resuming, attempt {attempt + 1} of {DOWNLOAD_RETRIES}")
+            continue
+
+        if code == 0 and out_path.exists():
+            return out_path
+        break
+
+    err = (err or "Unknown yt-dlp error")[-500:]
+    raise RuntimeError(f"yt-dlp failed: {err}")
+
+
+def _link_into(src: Path, dst: Path):
+    dst.unlink(missing_ok=True)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+    return dst
+
+
+def _cached_download(url: str, meta, fmt_args, name: str, work_dir: Path, label: str):
+    # Media is downloaded once per video into the cache and linked into the job;
+    # a re-submitted URL skips the download entirely
+    cached = video_dir(meta["key"]) / name
+    with video_lock(meta["key"]):
+        if cached.exists():
+            log(f"Reusing downloaded {name} for {meta['key']}")
+            os.utime(cached)
+        else:
+            # The partial file sits in the cache too, so even a new job resumes it
+            tmp = _yt_dlp(
+                [*fmt_args, *source_args(url, meta)],
+                cached.with_suffix(".tmp" + cached.suffix),
+                label,
+                progress=(10, 24),
+            )
+            os.replace(tmp, cached)
+        media = _link_into(cached, work_dir / name)
+
+    evict_media()
+    return media
+
+
+def download_youtube(url: str, work_dir: Path = WORK_DIR):
     update_status("Laster ned video...", 10, True)
 
-    title = safe_name(get_youtube_title(url))
-    project_dir = unique_project_dir(title)
+    meta = probe_video(url)
+    project_dir = unique_project_dir(safe_name(meta["title"]))
 
-    video_path = WORK_DIR / "video.mp4"
-    if video_path.exists():
-        video_path.unlink()
+    video_path = _cached_download(url, meta, ["-f", "mp4"], "video.mp4", work_dir, "Laster ned video...")
+    return video_path, project_dir
 
-    res = subprocess.run(
-        ["yt-dlp", "-f", "mp4", "-o", str(video_path), url],
-        stdout=subprocess.DEVNULL,
-        stderr=subprocess.PIPE,
-        text=True
-    )
 
-    if res.returncode != 0 or not video_path.exists():
-        err = (res.stderr or "Unknown yt-dlp error")[:500]
-        raise RuntimeError(f"yt-dlp failed: {err}")
+def is_local_media(source: str) -> bool:
+    return "://" not in source and Path(source).is_file()
+
 
+def use_local_media(path: Path, work_dir: Path = WORK_DIR):
+    # Link the file into the work dir so decoded audio and cuts never land beside the original
+    update_status("Leser lokal fil...", 10, True)
+
+    project_dir = unique_project_dir(safe_name(path.stem))
+    video_path = _link_into(path, work_dir / f"video{path.suffix.lower()}")
     return video_path, project_dir
+
+
+def download_audio(url: str, work_dir: Path = WORK_DIR):
+    update_status("Laster ned lyd...", 10, True)
+
+    meta = probe_video(url)
+    project_dir = unique_project_dir(safe_name(meta["title"]))
+
+    audio_path = _cached_download(
+        url, meta, ["-f", "bestaudio[ext=m4a]/bestaudio"], "audio.m4a", work_dir, "Laster ned lyd..."
+    )
+    return audio_path, project_dir
+
+
+def download_section(url: str, start: float, end: float, idx: int, work_dir: Path = WORK_DIR):
+    # The section file starts exactly at `start`
+    return _yt_dlp(
+        [
+            "-f",
+            "mp4",
+            "--download-sections",
+            f"*{start:.2f}-{end:.2f}",
+            "--force-keyframes-at-cuts",
+            *source_args(url, probe_video(url)),
+        ],
+        work_dir / f"section_{idx:02d}.mp4",
+    )
+
+
+def download_sections(url: str, ranges, work_dir: Path = WORK_DIR, workers: int = 3):
+    # ranges: [(start, end), ...]
+    update_status("Laster ned klipp...", 55, True)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        return list(pool.map(
+            carry_metrics(lambda item: download_section(url, *item[1], item[0], work_dir)),
+            enumerate(ranges, start=1),
+        ))
@@ -0,0 +1,61 @@
+import os
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+from clipgen.config import KEYFRAME_CACHE_DIR
+from clipgen.services.metrics import run_child
+from clipgen.services.utils import file_hash, log
+
+
+def keyframe_index(video_path: Path) -> np.ndarray:
+    # Sorted video keyframe timestamps (s), cached by media content hash.
+    # Reads packet flags only, so nothing is decoded even on multi-hour sources.
+    cache_file = KEYFRAME_CACHE_DIR / f"{file_hash(video_path)}.npy"
+    try:
+        return np.load(cache_file)
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError, EOFError) as e:
+        log(f"Dropping unreadable keyframe cache entry {cache_file.name}: {e}")
+        cache_file.unlink(missing_ok=True)
+
+    cmd = [
+        "ffprobe",
+        "-v",
+        "error",
+        "-select_streams",
+        "v:0",
+        "-show_entries",
+        "packet=pts_time,flags",
+        "-of",
+        "csv=p=0",
+        str(video_path),
+    ]
+
+    res = run_child(cmd, "ffprobe_keyframes")
+    if res.returncode != 0:
+        err = (res.stderr or "Unknown ffprobe error")[-1200:]
+        raise RuntimeError(f"ffprobe keyframe scan failed:\n{err}")
+
+    times = []
+    for line in res.stdout.splitlines():
+        pts, _, flags = line.partition(",")
+        if "K" in flags and pts not in ("", "N/A"):
+            times.append(float(pts))
+    keyframes = np.unique(np.array(times, dtype=np.float64))
+
+    KEYFRAME_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    # Only a complete file is moved into place
+    with tempfile.NamedTemporaryFile(dir=KEYFRAME_CACHE_DIR, suffix=".tmp", delete=False) as f:
+        np.save(f, keyframes)
+    os.replace(f.name, cache_file)
+    log(f"Keyframe index: {len(keyframes)} keyframe(s)")
+    return keyframes
+
+
+def seek_point(keyframes, t: float) -> float:
+    # Last keyframe at or before t: where a seek to t really starts decoding
+    i = np.searchsorted(keyframes, t + 1e-6, side="right")
+    return float(keyframes[i - 1]) if i else 0.0
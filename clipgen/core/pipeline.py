@@ -1,71 +1,396 @@
+import json
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from pathlib import Path
 
-from clipgen.core.downloader import download_youtube
-from clipgen.core.renderer import ffmpeg_render
+from clipgen.config import (
+    FAILED_METRICS_DIR,
+    INGEST_MODE,
+    RENDER_TIER,
+    RENDER_WORKERS,
+    SCENE_SNAP_TOLERANCE,
+    SCORING,
+    STREAMING,
+    WORK_DIR,
+)
+from clipgen.core.audio import SAMPLE_RATE, decode_audio, load_audio
+from clipgen.core.downloader import (
+    download_audio,
+    download_section,
+    download_sections,
+    download_youtube,
+    is_local_media,
+    use_local_media,
+)
+from clipgen.core.keyframes import keyframe_index
+from clipgen.core.renderer import (
+    clip_filename,
+    cut_source,
+    ffmpeg_render,
+    ffmpeg_render_batch,
+    ffmpeg_render_sections,
+)
+from clipgen.core.scenes import detect_scenes, snap_to_cut
+from clipgen.core.scoring import frame_rms, score_blocks
 from clipgen.core.segmenter import build_blocks, words_to_sentences
+from clipgen.core.selector import select_clips
+from clipgen.core.streaming import stream_clips
 from clipgen.core.subtitles import generate_ass_for_range
-from clipgen.core.transcriber import transcribe_words
+from clipgen.core.transcriber import iter_transcribed_words, transcribe_words
+from clipgen.core.words import WordStore
+from clipgen.services.metrics import JobMetrics, bind_metrics, carry_metrics, current_metrics, set_media_seconds, span
 from clipgen.services.status_service import update_status
 from clipgen.services.utils import log
 
 
-def run_pipeline():
-    update_status("Starter...", 3, True)
+# Written next to preview clips: everything a final render of one clip needs
+MANIFEST = "clips.json"
+METRICS = "metrics.json"
 
-    url = input().strip()
-    if not url:
-        update_status("Ingen URL", 0, False)
-        return
+_final_locks = {}
+_final_locks_guard = threading.Lock()
+
+
+def _no_stage(name):
+    return nullcontext()
+
+
+def load_manifest(project_dir: Path):
+    path = project_dir / MANIFEST
+    if not path.exists():
+        return None
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def _write_manifest(project_dir: Path, url: str, clips, sources):
+    # clips: (start, end, ass_file, out_file) with times relative to the matching source
+    entries = [
+        {
+            "index": idx,
+            "start": round(float(start), 3),
+            "end": round(float(end), 3),
+            "source": src.name,
+            "ass": ass_file.name,
+            "preview": out_file.name,
+            "final": clip_filename(idx, "final"),
+        }
+        for idx, ((start, end, ass_file, out_file), src) in enumerate(zip(clips, sources), start=1)
+    ]
+    tmp = project_dir / (MANIFEST + ".tmp")
+    tmp.write_text(json.dumps({"url": url, "clips": entries}, indent=2), encoding="utf-8")
+    os.replace(tmp, project_dir / MANIFEST)
+
+
+def _keep_sources(video_path: Path, clips, project_dir: Path, keyframes):
+    # Job work dirs are deleted afterwards, so final renders need their own copy of the
+    # source: a stream-copied keyframe-aligned cut per clip, not the whole video.
+    # Returns the clips with times relative to their cut, and the cut files
+    kept = []
+    sources = []
+    for idx, (start, end, ass_file, out_file) in enumerate(clips, start=1):
+        src = project_dir / f"source_{idx:02d}{video_path.suffix}"
+        offset = cut_source(video_path, start, end, src, keyframes)
+        kept.append((start - offset, end - offset, ass_file, out_file))
+        sources.append(src)
+    return kept, sources
+
+
+def _run_streaming(url, video_path, audio_path, project_dir, clip_count, language, audio_first, work_dir, stage, tier):
+    # Transcription and rendering overlap, so the job holds both stage slots
+    sections = {}
+    # Preview sections are downloaded straight into the project so they outlive the job
+    section_dir = project_dir if tier == "preview" else work_dir
+
+    with stage("transcribe"), stage("render"), span("transcribe_render"), \
+            ThreadPoolExecutor(max_workers=max(1, RENDER_WORKERS)) as pool:
+        def render(idx, start, end, ass_file, out_file):
+            if audio_first:
+                fut = pool.submit(
+                    carry_metrics(_render_section), url, idx, start, end, ass_file, out_file, section_dir, tier
+                )
+                sections[idx] = fut
+                return fut
+            return pool.submit(carry_metrics(ffmpeg_render), video_path, start, end, ass_file, out_file, 0, tier)
+
+        score = None
+        if SCORING:
+            # One pass over the audio; each window then scores only its own blocks and words
+            rms = frame_rms(load_audio(audio_path))
+
+            def score(starts, ends, window_words):
+                return score_blocks(starts, ends, WordStore.from_words(window_words), rms=rms)
+
+        snap = None
+        if SCENE_SNAP_TOLERANCE > 0 and not audio_first:
+            # Runs beside transcription; only waited on when the first clip is cut
+            cuts = pool.submit(carry_metrics(_detect_scenes), video_path)
+
+            def snap(start, end):
+                return _snap(start, end, cuts.result())
+
+        words = iter_transcribed_words(video_path, language=language, audio=audio_path)
+        clips = stream_clips(
+            words,
+            project_dir,
+            clip_count,
+            render,
+            tier=tier,
+            score=score,
+            duration=len(load_audio(audio_path)) / SAMPLE_RATE,
+            snap=snap,
+            snap_tolerance=SCENE_SNAP_TOLERANCE if snap is not None else 0.0,
+        )
+
+    if tier == "preview" and clips:
+        if audio_first:
+            clips = [(0, end - start, a, o) for start, end, a, o in clips]
+            sources = [sections[idx].result() for idx in range(1, len(clips) + 1)]
+        else:
+            clips, sources = _keep_sources(video_path, clips, project_dir, keyframe_index(video_path))
+        _write_manifest(project_dir, url, clips, sources)
+
+    return len(clips)
+
+
+def _render_section(url, idx, start, end, ass_file, out_file, work_dir, tier="final"):
+    section = download_section(url, start, end, idx, work_dir)
+    ffmpeg_render(section, 0, end - start, ass_file, out_file, tier=tier)
+    return section
+
+
+def _final_lock(out_file: Path) -> threading.Lock:
+    with _final_locks_guard:
+        return _final_locks.setdefault(out_file, threading.Lock())
+
+
+def render_final(project_dir: Path, idx: int, stage=_no_stage) -> Path:
+    # Full-quality encode of one previewed clip, from the source kept in the project
+    manifest = load_manifest(project_dir)
+    clip = next((c for c in (manifest or {}).get("clips", []) if c["index"] == idx), None)
+    if clip is None:
+        raise ValueError(f"No clip {idx} in {project_dir.name}")
+
+    out_file = project_dir / clip["final"]
+    # One render per output at a time: a second request for the clip waits, then reuses it
+    with _final_lock(out_file):
+        if out_file.exists():
+            log(f"Clip {idx} is already rendered in full quality.")
+            return out_file
+
+        # Render under a temporary name so the project page never lists a half-written file;
+        # the pid keeps it apart from another process rendering the same clip
+        tmp = out_file.with_name(f"{out_file.stem}.part{os.getpid()}{out_file.suffix}")
+
+        # Final renders add their spans to the job's metrics.json
+        metrics_path = project_dir / METRICS
+        metrics = JobMetrics.load(metrics_path)
+        prev = current_metrics()
+        bind_metrics(metrics)
+        try:
+            with stage("render"), span("final_render", media_seconds=clip["end"] - clip["start"], clip=idx):
+                update_status(f"Renderer klipp {idx} i full kvalitet...", 10, True)
+                t0 = time.perf_counter()
+                ffmpeg_render(
+                    project_dir / clip["source"],
+                    clip["start"],
+                    clip["end"],
+                    project_dir / clip["ass"],
+                    tmp,
+                    tier="final",
+                    on_progress=lambda fraction, fps: update_status(
+                        f"Renderer klipp {idx} i full kvalitet... {100 * fraction:.0f}% ({fps:.0f} fps)",
+                        10 + 89 * fraction,
+                        True,
+                    ),
+                )
+                os.replace(tmp, out_file)
+                log(f"Final render of clip {idx} in {time.perf_counter() - t0:.1f}s.")
+        finally:
+            tmp.unlink(missing_ok=True)
+            bind_metrics(prev)
+            metrics.save(metrics_path)
+
+    return out_file
 
-    clip_count = int(os.getenv("CLIP_COUNT", "3"))
-    language = os.getenv("CLIP_LANGUAGE", "auto")
 
+def run_job(
+    url: str,
+    clip_count=3,
+    language="auto",
+    work_dir: Path = WORK_DIR,
+    stage=_no_stage,
+    tier=RENDER_TIER,
+    allow_local=False,
+):
+    # url is a video URL, or with allow_local a media file on this machine. Only trusted
+    # callers (the batch CLI) set it: web input must never name server-side files.
+    # stage(name) is entered around each stage so a scheduler can limit concurrency;
+    # tier "preview" also keeps the source and a clip manifest for render_final().
+    # Per-stage timings go to metrics.json in the project dir, failed runs included; a run
+    # that fails before it has one (probe, download) is saved under FAILED_METRICS_DIR,
+    # named by work_dir (the job id for queued jobs).
+    # Returns (project_dir, number of clips rendered)
+    metrics = JobMetrics()
+    prev = current_metrics()
+    bind_metrics(metrics)
     try:
+        return _run_job(url, clip_count, language, work_dir, stage, tier, metrics, allow_local)
+    except Exception as e:
+        metrics.url = url
+        metrics.error = str(e)[-500:]
+        if metrics.path is None:
+            FAILED_METRICS_DIR.mkdir(parents=True, exist_ok=True)
+            metrics.path = FAILED_METRICS_DIR / f"{time.strftime('%Y%m%d-%H%M%S')}-{work_dir.name}.json"
+        raise
+    finally:
+        bind_metrics(prev)
+        if metrics.path is not None:
+            metrics.save(metrics.path)
+
+
+def _run_job(url, clip_count, language, work_dir, stage, tier, metrics, allow_local):
+    t0 = time.perf_counter()
+    local = is_local_media(url)
+    if local and not allow_local:
+        raise RuntimeError("Local files are only accepted from the batch CLI")
+    work_dir.mkdir(parents=True, exist_ok=True)
+    audio_first = INGEST_MODE == "audio" and not local
+
+    with stage("download"), span("download"):
         log("Downloading...")
-        video_path, project_dir = download_youtube(url)
+        if local:
+            video_path, project_dir = use_local_media(Path(url), work_dir)
+        elif audio_first:
+            # Transcribe from the audio-only stream; video is fetched per clip below
+            video_path, project_dir = download_audio(url, work_dir)
+        else:
+            video_path, project_dir = download_youtube(url, work_dir)
         log(f"Project: {project_dir.name}")
+    metrics.path = project_dir / METRICS
+
+    if STREAMING:
+        with stage("transcribe"):
+            audio_path = _decode(video_path)
+
+        log("Transcribing and rendering (streaming)...")
+        n = _run_streaming(
+            url, video_path, audio_path, project_dir, clip_count, language, audio_first, work_dir, stage, tier
+        )
+        log(f"Done in {time.perf_counter() - t0:.1f}s.")
+        return project_dir, n
+
+    with stage("transcribe"):
+        audio_path = _decode(video_path)
 
         log("Transcribing...")
-        words = transcribe_words(video_path, language=language)
+        with span("transcribe"):
+            words = WordStore.from_words(transcribe_words(video_path, language=language, audio=audio_path))
 
-        log("Building blocks...")
+    log("Building blocks...")
+    with span("segment", words=len(words)):
         sentences = words_to_sentences(words)
         blocks = build_blocks(sentences, 3)
-        if not blocks:
-            update_status("Fant ingen blokker.", 0, False)
-            return
+    if not blocks:
+        return project_dir, 0
 
-        update_status("Velger klipp...", 45, True)
-        min_distance = 45
-        selected = []
-        for b in blocks:
-            if len(selected) >= clip_count:
-                break
-            if all(abs(b["start"] - s["start"]) >= min_distance for s in selected):
-                selected.append(b)
-
-        i = 0
-        while len(selected) < clip_count and i < len(blocks):
-            b = blocks[i]
-            if all(abs(b["start"] - s["start"]) >= min_distance for s in selected):
-                selected.append(b)
-            i += 1
+    update_status("Velger klipp...", 45, True)
+    with span("select", blocks=len(blocks)):
+        scores = None
+        if SCORING:
+            scores = score_blocks(blocks.starts, blocks.ends, words, load_audio(audio_path))
+        picked = select_clips(blocks.starts, blocks.ends, clip_count, min_distance=45, scores=scores)
+        selected = [blocks[i] for i in picked]
 
+    with stage("render"):
         update_status("Renderer klipp...", 60, True)
 
+        cuts = None
+        keyframes = None
+        if SCENE_SNAP_TOLERANCE > 0 and not audio_first:
+            cuts = _detect_scenes(video_path)
+        if tier == "preview" and not audio_first:
+            # Full packet scan of the source; only the kept stream-copy sources need it
+            with span("keyframe_index"):
+                keyframes = keyframe_index(video_path)
+
+        clips = []
         for idx, b in enumerate(selected, start=1):
             start = max(0, b["start"] - 3)
             end = b["end"] + 3
+            if cuts is not None:
+                start, end = _snap(start, end, cuts)
 
             ass_file = project_dir / f"{idx:02d}.ass"
-            out_file = project_dir / f"{idx:02d}_clip_vertical_subs.mp4"
+            out_file = project_dir / clip_filename(idx, tier)
+
+            with span("subtitles", media_seconds=end - start, clip=idx):
+                generate_ass_for_range(words, start, end, ass_file)
+            clips.append((start, end, ass_file, out_file))
+
+        clip_seconds = sum(end - start for start, end, _, _ in clips)
+        if audio_first:
+            section_dir = project_dir if tier == "preview" else work_dir
+            with span("download_sections", media_seconds=clip_seconds):
+                sections = download_sections(url, [(c[0], c[1]) for c in clips], section_dir)
+            update_status("Renderer klipp...", 60, True)
+            clips = [(0, end - start, a, o) for start, end, a, o in clips]
+            with span("render", media_seconds=clip_seconds, clips=len(clips)):
+                ffmpeg_render_sections(sections, clips, tier=tier)
+        else:
+            with span("render", media_seconds=clip_seconds, clips=len(clips)):
+                ffmpeg_render_batch(video_path, clips, tier=tier, keyframes=keyframes)
+
+        if tier == "preview" and clips:
+            if not audio_first:
+                clips, sections = _keep_sources(video_path, clips, project_dir, keyframes)
+            _write_manifest(project_dir, url, clips, sections)
+
+    log(f"Done in {time.perf_counter() - t0:.1f}s.")
+    return project_dir, len(clips)
+
+
+def _detect_scenes(video_path: Path):
+    with span("scene_detect"):
+        return detect_scenes(video_path)
+
+
+def _snap(start: float, end: float, cuts):
+    # Only ever widen the clip, so speech is never cut off
+    start = max(0, snap_to_cut(start, cuts, start - SCENE_SNAP_TOLERANCE, start))
+    end = snap_to_cut(end, cuts, end, end + SCENE_SNAP_TOLERANCE)
+    return start, end
 
-            log(f"Rendering {idx}/{len(selected)}...")
-            generate_ass_for_range(words, start, end, ass_file)
-            ffmpeg_render(video_path, start, end, ass_file, out_file)
+
+def _decode(video_path: Path) -> Path:
+    log("Decoding audio...")
+    with span("decode_audio"):
+        audio_path = decode_audio(video_path)
+    # Job-level spans measure against the media length from here on
+    set_media_seconds(len(load_audio(audio_path)) / SAMPLE_RATE)
+    return audio_path
+
+
+def run_pipeline():
+    update_status("Starter...", 3, True)
+
+    url = input().strip()
+    if not url:
+        update_status("Ingen URL", 0, False)
+        return
+
+    clip_count = int(os.getenv("CLIP_COUNT", "3"))
+    language = os.getenv("CLIP_LANGUAGE", "auto")
+
+    try:
+        _, n = run_job(url, clip_count, language)
+        if not n:
+            update_status("Fant ingen blokker.", 0, False)
+            return
 
         update_status("Ferdig!", 100, False)
-        log("Done.")
 
     except Exception as e:
         log(f"ERROR: {e}")
@@ -1,8 +1,222 @@
+import math
+import os
 import subprocess
 import shutil
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from pathlib import Path
 
-from clipgen.config import VERT_H, VERT_W, WORK_DIR
+from clipgen.config import (
+    RENDER_BATCH_MAX_GAP,
+    RENDER_TIERS,
+    RENDER_TIMEOUT_BASE,
+    RENDER_TIMEOUT_FACTOR,
+    RENDER_WORKERS,
+    WORK_DIR,
+)
+from clipgen.core.keyframes import seek_point
+from clipgen.services.metrics import carry_metrics, child_peak_rss, record_child
+from clipgen.services.render_cache import fetch_render, render_key, store_render
+from clipgen.services.status_service import update_status
+from clipgen.services.utils import log
+
+
+def _stage_subs(ass_file: Path) -> Path:
+    # ass= is resolved relative to WORK_DIR (avoids drive-letter escaping);
+    # every render gets its own copy so renders can run side by side
+    fd, name = tempfile.mkstemp(prefix="subs_", suffix=".ass", dir=WORK_DIR)
+    os.close(fd)
+    shutil.copyfile(ass_file, name)
+    return Path(name)
+
+
+def _tier(name: str):
+    try:
+        return RENDER_TIERS[name]
+    except KeyError:
+        raise ValueError(f"Unknown render tier: {name}") from None
+
+
+def clip_filename(idx: int, tier: str = "final") -> str:
+    if tier == "preview":
+        return f"{idx:02d}_preview.mp4"
+    return f"{idx:02d}_clip_vertical_subs.mp4"
+
+
+def _canvas(tier: str, ass_name: str) -> str:
+    # Frame-rate drop first so the scale and subtitle passes see fewer frames
+    t = _tier(tier)
+    w, h = t["width"], t["height"]
+    fps = f"fps={t['fps']}," if t["fps"] else ""
+    return (
+        f"{fps}scale={w}:{h}:force_original_aspect_ratio=decrease,"
+        f"pad={w}:{h}:(ow-iw)/2:(oh-ih)/2:white,setsar=1,"
+        f"ass={ass_name}"
+    )
+
+
+def _encode_args(threads: int, tier: str = "final"):
+    t = _tier(tier)
+    args = [
+        "-c:v",
+        "libx264",
+        "-preset",
+        t["preset"],
+        "-crf",
+        str(t["crf"]),
+        "-c:a",
+        "aac",
+        "-movflags",
+        "+faststart",
+    ]
+    if threads:
+        args += ["-threads", str(threads)]
+    return args
+
+
+# ffmpeg killed at its time limit; rerunning the same input would likely hang again
+class _Hung(RuntimeError):
+    pass
+
+
+def _out_seconds(progress) -> float:
+    # out_time_us is microseconds; older builds only have out_time_ms, also in microseconds
+    value = progress.get("out_time_us") or progress.get("out_time_ms") or ""
+    try:
+        return max(0.0, int(value) / 1e6)
+    except ValueError:  # "N/A" before the first frame
+        return 0.0
+
+
+def _reap(proc, guard: threading.Lock, state):
+    # Wait for the exit without reaping, so the watchdog can never signal a recycled pid,
+    # then reap with wait4() for the child's own rusage (None where unavailable)
+    if not hasattr(os, "waitid"):
+        proc.wait()
+        with guard:
+            state["exited"] = True
+        return None
+
+    os.waitid(os.P_PID, proc.pid, os.WEXITED | os.WNOWAIT)
+    with guard:
+        state["exited"] = True
+    _, status, rusage = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    return rusage
+
+
+def _run_ffmpeg(
+    cmd,
+    media_seconds: float = None,
+    stage: str = "ffmpeg",
+    length: float = None,
+    on_progress=None,
+    **labels,
+):
+    # Runs ffmpeg with -progress output on stdout. on_progress(fraction, fps) follows
+    # out_time against the output length (default media_seconds). A run past the time
+    # limit for its media seconds is killed. Recorded as a metrics span with encode fps.
+    length = length or media_seconds
+    limit = RENDER_TIMEOUT_BASE + RENDER_TIMEOUT_FACTOR * (media_seconds or 0)
+    cmd = [cmd[0], "-nostats", "-progress", "pipe:1", *cmd[1:]]
+
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(
+        cmd,
+        cwd=str(WORK_DIR),  # 👈 Important
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    # Drained on the side so a full stderr pipe never stalls ffmpeg
+    stderr = deque(maxlen=100)
+    drain = threading.Thread(target=stderr.extend, args=(proc.stderr,), daemon=True)
+    drain.start()
+
+    guard = threading.Lock()
+    state = {"exited": False, "killed": False}
+
+    def kill():
+        with guard:
+            if not state["exited"]:
+                state["killed"] = True
+                proc.kill()
+
+    watchdog = threading.Timer(limit, kill)
+    watchdog.daemon = True
+    watchdog.start()
+
+    progress = {}
+    peak = None
+    try:
+        # key=value lines; each block ends with progress=continue or progress=end
+        for line in proc.stdout:
+            key, _, value = line.strip().partition("=")
+            progress[key] = value
+            if key == "progress":
+                peak = child_peak_rss(proc.pid) or peak
+            if key == "progress" and on_progress is not None and length:
+                try:
+                    fps = float(progress.get("fps") or 0)
+                except ValueError:
+                    fps = 0.0
+                on_progress(min(1.0, _out_seconds(progress) / length), fps)
+    finally:
+        proc.stdout.close()
+        rusage = _reap(proc, guard, state)
+        watchdog.cancel()
+        drain.join()
+        proc.stderr.close()
+
+    wall = time.perf_counter() - t0
+    frames = int(progress.get("frame") or 0)
+    record_child(
+        stage,
+        wall,
+        rusage,
+        media_seconds,
+        peak,
+        frames=frames,
+        encode_fps=round(frames / wall, 2) if wall else 0.0,
+        **labels,
+    )
+
+    if state["killed"]:
+        log(f"ffmpeg killed after {limit:.0f}s at {_out_seconds(progress):.1f}s of output")
+        raise _Hung(f"ffmpeg timed out after {limit:.0f}s (limit for {media_seconds or 0:.1f}s of media)")
+    if proc.returncode != 0:
+        err = ("".join(stderr) or "Unknown ffmpeg error")[-1200:]
+        raise RuntimeError(f"ffmpeg failed:\n{err}")
+
+
+def _cache_key(video_path: Path, clip, tier: str) -> str:
+    # Keyed on the single-clip command; a batch render of the same clip is equivalent.
+    # Thread count and file names do not change the encode, so they stay out.
+    start, end, ass_file, _ = clip
+    args = ["-ss", start, "-t", max(0.1, end - start), "-vf", _canvas(tier, "subs.ass"), *_encode_args(0, tier)]
+    return render_key(video_path, start, end, ass_file, args)
+
+
+def _reuse_cached(units, tier: str):
+    # units: [(source, clip), ...]; cached clips are linked into place.
+    # Returns (units still to render, {output_file: cache key})
+    todo = []
+    keys = {}
+    for src, clip in units:
+        key = _cache_key(src, clip, tier)
+        if fetch_render(key, clip[3]):
+            continue
+        # The old output may be a hardlink into the cache; ffmpeg -y would truncate it in place
+        clip[3].unlink(missing_ok=True)
+        keys[clip[3]] = key
+        todo.append((src, clip))
+
+    if len(todo) < len(units):
+        log(f"Render cache: reused {len(units) - len(todo)} of {len(units)} clip(s)")
+    return todo, keys
 
 
 def ffmpeg_render(
@@ -11,22 +225,33 @@ def ffmpeg_render(
     end: float,
     ass_file: Path,
     output_file: Path,
+    threads: int = 0,
+    tier: str = "final",
+    on_progress=None,
 ):
-    duration = max(0.1, end - start)
-
-    # ---- COPY ASS TO SAFE TEMP LOCATION ----
-    temp_ass = WORK_DIR / "temp_subs.ass"
+    # on_progress(fraction, fps) is called as the encode advances
+    clip = (start, end, ass_file, output_file)
+    todo, keys = _reuse_cached([(video_path, clip)], tier)
+    if todo:
+        _ffmpeg_render(video_path, start, end, ass_file, output_file, threads, tier, on_progress)
+        store_render(keys[output_file], output_file)
 
-    if temp_ass.exists():
-        temp_ass.unlink()
 
-    shutil.copyfile(ass_file, temp_ass)
+def _ffmpeg_render(
+    video_path: Path,
+    start: float,
+    end: float,
+    ass_file: Path,
+    output_file: Path,
+    threads: int = 0,
+    tier: str = "final",
+    on_progress=None,
+):
+    duration = max(0.1, end - start)
+    temp_ass = _stage_subs(ass_file)
 
-    vf = (
-        f"scale={VERT_W}:{VERT_H}:force_original_aspect_ratio=decrease,"
-        f"pad={VERT_W}:{VERT_H}:(ow-iw)/2:(oh-ih)/2:white,"
-        f"ass={temp_ass.name}"
-    )
+    # ASS files are laid out for VERT_W x VERT_H; libass rescales them to the tier size
+    vf = _canvas(tier, temp_ass.name)
 
     cmd = [
         "ffmpeg",
@@ -39,31 +264,214 @@ def ffmpeg_render(
         str(video_path),
         "-vf",
         vf,
-        "-c:v",
-        "libx264",
-        "-preset",
-        "ultrafast",
-        "-crf",
-        "24",
-        "-c:a",
-        "aac",
-        "-movflags",
-        "+faststart",
+        *_encode_args(threads, tier),
         str(output_file),
     ]
 
-    res = subprocess.run(
-        cmd,
-        cwd=str(WORK_DIR),  # 👈 Important
-        stdout=subprocess.DEVNULL,
-        stderr=subprocess.PIPE,
-        text=True,
-    )
+    try:
+        _run_ffmpeg(cmd, duration, on_progress=on_progress, clips=1, tier=tier)
+    finally:
+        temp_ass.unlink(missing_ok=True)
 
-    if res.returncode != 0:
-        err = (res.stderr or "Unknown ffmpeg error")[-1200:]
-        raise RuntimeError(f"ffmpeg failed:\n{err}")
 
-    # Clean temp file
-    if temp_ass.exists():
-        temp_ass.unlink()
+# ---- BATCH: one decode for clips that sit close together ----
+
+def _group_clips(clips, max_gap: float, max_size: int = 0, keyframes=None):
+    # With a keyframe index, a clip whose own seek would land inside the group
+    # joins it whatever the gap: a separate run would decode those frames too
+    groups = []
+    group_end = None
+
+    for clip in sorted(clips, key=lambda c: c[0]):
+        near = groups and (
+            clip[0] - group_end <= max_gap
+            or (keyframes is not None and seek_point(keyframes, clip[0]) <= group_end)
+        )
+        if near and (not max_size or len(groups[-1]) < max_size):
+            groups[-1].append(clip)
+            group_end = max(group_end, clip[1])
+        else:
+            groups.append([clip])
+            group_end = clip[1]
+
+    return groups
+
+
+def _render_group(video_path: Path, group, threads: int = 0, tier: str = "final", on_progress=None):
+    t0 = min(c[0] for c in group)
+    t1 = max(c[1] for c in group)
+    n = len(group)
+
+    staged = [_stage_subs(ass_file) for _, _, ass_file, _ in group]
+
+    # Decode once, then trim before scaling so frames in the gaps are dropped early
+    graph = [
+        f"[0:v]split={n}" + "".join(f"[v{i}]" for i in range(n)),
+        f"[0:a]asplit={n}" + "".join(f"[a{i}]" for i in range(n)),
+    ]
+    for i, (start, end, _, _) in enumerate(group):
+        s = start - t0
+        e = max(s + 0.1, end - t0)
+        graph.append(
+            f"[v{i}]trim=start={s:.3f}:end={e:.3f},setpts=PTS-STARTPTS,"
+            f"{_canvas(tier, staged[i].name)}[vo{i}]"
+        )
+        graph.append(f"[a{i}]atrim=start={s:.3f}:end={e:.3f},asetpts=PTS-STARTPTS[ao{i}]")
+
+    cmd = [
+        "ffmpeg",
+        "-y",
+        "-ss",
+        str(t0),
+        "-t",
+        str(max(0.1, t1 - t0)),
+        "-i",
+        str(video_path),
+        "-filter_complex",
+        ";".join(graph),
+    ]
+    for i, (_, _, _, output_file) in enumerate(group):
+        cmd += [
+            "-map",
+            f"[vo{i}]",
+            "-map",
+            f"[ao{i}]",
+            "-fps_mode",
+            "passthrough",
+            *_encode_args(threads, tier),
+            str(output_file),
+        ]
+
+    try:
+        # Outputs encode side by side, so progress follows the longest one
+        _run_ffmpeg(
+            cmd,
+            sum(end - start for start, end, _, _ in group),
+            length=max(end - start for start, end, _, _ in group),
+            on_progress=on_progress,
+            clips=n,
+            tier=tier,
+        )
+    finally:
+        for p in staged:
+            p.unlink(missing_ok=True)
+
+
+def _render_unit(video_path: Path, group, threads: int, tier: str = "final", on_progress=None):
+    # on_progress(fraction, fps) covers the whole group
+    if len(group) > 1:
+        try:
+            _render_group(video_path, group, threads, tier, on_progress)
+            return
+        except _Hung:
+            raise
+        except RuntimeError as e:
+            # e.g. sources without an audio stream; fall back per clip
+            log(f"Batch render failed, rendering clips separately: {e}")
+
+    n = len(group)
+    for k, (start, end, ass_file, output_file) in enumerate(group):
+        clip_progress = None
+        if on_progress is not None:
+            clip_progress = lambda fraction, fps, k=k: on_progress((k + fraction) / n, fps)
+        _ffmpeg_render(video_path, start, end, ass_file, output_file, threads, tier, clip_progress)
+
+
+def _render_units(units, workers: int, tier: str = "final", keys=None):
+    # units: [(source, [clip, ...]), ...]; one ffmpeg process per unit.
+    # keys: {output_file: render cache key} for outputs to store once rendered
+    keys = keys or {}
+    total = sum(len(group) for _, group in units)
+    workers = max(1, min(workers, len(units)))
+    threads = max(1, (os.cpu_count() or 1) // workers) if workers > 1 else 0
+    log(f"Rendering {total} clip(s) in {len(units)} ffmpeg run(s), {workers} at a time")
+
+    # unit index -> (clips done, encode fps); workers replace their entry, this thread
+    # reports it, since update_status() goes to the job bound to this thread. Every key
+    # exists up front so the dict never changes size while it is read.
+    progress = {i: (0.0, 0.0) for i in range(len(units))}
+
+    def reporter(i, n):
+        def report(fraction, fps):
+            progress[i] = (fraction * n, fps)
+        return report
+
+    finished = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(carry_metrics(_render_unit), src, group, threads, tier, reporter(i, len(group))): i
+            for i, (src, group) in enumerate(units)
+        }
+        pending = set(futures)
+        while pending:
+            ready, pending = wait(pending, timeout=1, return_when=FIRST_COMPLETED)
+            for fut in ready:
+                fut.result()
+                group = units[futures[fut]][1]
+                for clip in group:
+                    if clip[3] in keys:
+                        store_render(keys[clip[3]], clip[3])
+                finished += len(group)
+                progress[futures[fut]] = (len(group), 0.0)
+
+            snapshot = list(progress.values())
+            done = sum(clips for clips, _ in snapshot)
+            fps = sum(fps for _, fps in snapshot)
+            status = f"Renderer klipp... ({finished}/{total}, {100 * done / total:.0f}%"
+            status += f", {fps:.0f} fps)" if fps else ")"
+            update_status(status, 60 + 40 * done / total - 1, True)
+
+
+def ffmpeg_render_batch(
+    video_path: Path,
+    clips,
+    max_gap: float = RENDER_BATCH_MAX_GAP,
+    workers: int = RENDER_WORKERS,
+    tier: str = "final",
+    keyframes=None,
+):
+    # clips: iterable of (start, end, ass_file, output_file)
+    todo, keys = _reuse_cached([(video_path, c) for c in clips], tier)
+    clips = [c for _, c in todo]
+    if not clips:
+        return
+
+    workers = max(1, min(workers, len(clips)))
+    # Cap group size so there is at least one unit of work per worker
+    groups = _group_clips(clips, max_gap, math.ceil(len(clips) / workers), keyframes)
+    _render_units([(video_path, g) for g in groups], workers, tier, keys)
+
+
+def ffmpeg_render_sections(sections, clips, workers: int = RENDER_WORKERS, tier: str = "final"):
+    # sections[i] is a cut of the source holding clips[i]; clip times are section-relative
+    todo, keys = _reuse_cached(list(zip(sections, clips)), tier)
+    if todo:
+        _render_units([(src, [clip]) for src, clip in todo], workers, tier, keys)
+
+
+def cut_source(video_path: Path, start: float, end: float, output_file: Path, keyframes) -> float:
+    # Stream-copy the keyframe-aligned span holding [start, end]; nothing is re-encoded.
+    # Returns the cut's offset in the source, so clip times become start - offset.
+    offset = seek_point(keyframes, start)
+    cmd = [
+        "ffmpeg",
+        "-y",
+        "-ss",
+        f"{offset:.6f}",
+        "-i",
+        str(video_path),
+        # A second of slack so the last packets before `end` are never dropped
+        "-t",
+        f"{end - offset + 1:.3f}",
+        "-map",
+        "0:v:0",
+        "-map",
+        "0:a?",
+        "-c",
+        "copy",
+        "-avoid_negative_ts",
+        "make_zero",
+        str(output_file),
+    ]
+    _run_ffmpeg(cmd, end - start, stage="ffmpeg_copy")
+    return offset
@@ -0,0 +1,79 @@
+import os
+import re
+import subprocess
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+from clipgen.config import SCENE_CACHE_DIR
+from clipgen.services.metrics import run_child
+from clipgen.services.utils import file_hash, log
+
+SCENE_THRESHOLD = 0.3
+# Analysis decode: a few small frames per second is plenty to find cuts
+ANALYSIS_FPS = 4
+ANALYSIS_WIDTH = 160
+
+_PTS_RE = re.compile(r"pts_time:\s*([0-9.]+)")
+
+
+def detect_scenes(video_path: Path) -> np.ndarray:
+    # Sorted cut timestamps (s), cached by media content hash so re-runs skip the decode
+    cache_file = SCENE_CACHE_DIR / f"{file_hash(video_path)}.npy"
+    try:
+        return np.load(cache_file)
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError, EOFError) as e:
+        log(f"Dropping unreadable scene cache entry {cache_file.name}: {e}")
+        cache_file.unlink(missing_ok=True)
+
+    cmd = [
+        "ffmpeg",
+        "-nostdin",
+        "-hide_banner",
+        "-skip_frame",
+        "noref",
+        "-skip_loop_filter",
+        "all",
+        "-an",
+        "-sn",
+        "-i",
+        str(video_path),
+        "-vf",
+        f"fps={ANALYSIS_FPS},scale={ANALYSIS_WIDTH}:-2,select='gt(scene,{SCENE_THRESHOLD})',showinfo",
+        "-f",
+        "null",
+        "-",
+    ]
+
+    res = run_child(cmd, "ffmpeg_scenes", stdout=subprocess.DEVNULL)
+    if res.returncode != 0:
+        err = (res.stderr or "Unknown ffmpeg error")[-1200:]
+        raise RuntimeError(f"ffmpeg scene detection failed:\n{err}")
+
+    cuts = np.array(
+        sorted(float(m.group(1)) for line in res.stderr.splitlines()
+               if "showinfo" in line and (m := _PTS_RE.search(line))),
+        dtype=np.float64,
+    )
+
+    SCENE_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    # Written aside and moved into place, so a crash or a concurrent job never leaves
+    # a partial entry behind
+    with tempfile.NamedTemporaryFile(dir=SCENE_CACHE_DIR, suffix=".tmp", delete=False) as f:
+        np.save(f, cuts)
+    os.replace(f.name, cache_file)
+    log(f"Scene analysis: {len(cuts)} cut(s)")
+    return cuts
+
+
+def snap_to_cut(t: float, cuts, lo: float, hi: float) -> float:
+    # Nearest cut to t within [lo, hi], or t unchanged
+    i0 = np.searchsorted(cuts, lo, side="left")
+    i1 = np.searchsorted(cuts, hi, side="right")
+    if i1 <= i0:
+        return t
+    window = cuts[i0:i1]
+    return float(window[np.argmin(np.abs(window - t))])
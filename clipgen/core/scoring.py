@@ -0,0 +1,86 @@
+import numpy as np
+
+from clipgen.core.audio import SAMPLE_RATE
+
+FRAME_SECONDS = 0.1
+# Gap between words (s) that counts as a pause
+PAUSE_SECONDS = 0.3
+# Frames louder than this quantile count as peaks
+PEAK_QUANTILE = 0.9
+
+WEIGHTS = {
+    "loudness": 1.0,
+    "peaks": 0.5,
+    "words_per_second": 1.0,
+    "pause_density": -1.0,
+}
+
+
+def frame_rms(audio, frame_seconds: float = FRAME_SECONDS, sample_rate: int = SAMPLE_RATE):
+    # Read the (memory-mapped) buffer in chunks so RAM stays flat on long videos
+    hop = int(frame_seconds * sample_rate)
+    n = len(audio) // hop
+    rms = np.empty(n, dtype=np.float32)
+    chunk = 6000  # frames, i.e. 10 minutes at 0.1 s
+
+    for f0 in range(0, n, chunk):
+        f1 = min(n, f0 + chunk)
+        x = np.asarray(audio[f0 * hop:f1 * hop], dtype=np.float32).reshape(f1 - f0, hop)
+        rms[f0:f1] = np.sqrt(np.einsum("ij,ij->i", x, x) / hop)
+
+    return rms
+
+
+def _prefix(x):
+    p = np.zeros(len(x) + 1, dtype=np.float64)
+    np.cumsum(x, out=p[1:])
+    return p
+
+
+def _zscore(x):
+    std = x.std()
+    return (x - x.mean()) / std if std > 0 else np.zeros_like(x)
+
+
+def block_features(starts, ends, words, audio=None, frame_seconds: float = FRAME_SECONDS, rms=None):
+    # One vectorised pass per feature: every window sum is a difference of prefix sums.
+    # rms: frame_rms() of the audio, for callers that score the same audio repeatedly
+    starts = np.asarray(starts, dtype=np.float64)
+    ends = np.asarray(ends, dtype=np.float64)
+    duration = np.maximum(ends - starts, 1e-3)
+    features = {}
+
+    if rms is None:
+        rms = frame_rms(audio, frame_seconds) if audio is not None else np.zeros(0)
+    # Audio shorter than one frame has no loudness to compare
+    if len(rms):
+        f0 = np.clip((starts / frame_seconds).astype(np.int64), 0, len(rms))
+        f1 = np.clip(np.ceil(ends / frame_seconds).astype(np.int64), 0, len(rms))
+        nframes = np.maximum(f1 - f0, 1)
+
+        p_rms = _prefix(rms)
+        p_peak = _prefix(rms > np.quantile(rms, PEAK_QUANTILE))
+        features["loudness"] = (p_rms[f1] - p_rms[f0]) / nframes
+        features["peaks"] = (p_peak[f1] - p_peak[f0]) / nframes
+
+    w_starts = words.starts
+    # The store's running-max starts: raw starts may be slightly out of order
+    i0, i1 = words.spans(starts, ends)
+    features["words_per_second"] = (i1 - i0) / duration
+
+    # gaps[k]: silence after word k; pauses inside a window are gaps i0..i1-2
+    gaps = np.clip(w_starts[1:] - words.ends[:-1], 0, None) if len(w_starts) > 1 else np.zeros(0)
+    p_pause = _prefix(np.where(gaps >= PAUSE_SECONDS, gaps, 0.0))
+    g1 = np.clip(i1 - 1, 0, len(gaps))
+    g0 = np.minimum(i0, g1)
+    features["pause_density"] = (p_pause[g1] - p_pause[g0]) / duration
+
+    return features
+
+
+def score_blocks(starts, ends, words, audio=None, weights=WEIGHTS, rms=None):
+    features = block_features(starts, ends, words, audio, rms=rms)
+    score = np.zeros(len(starts), dtype=np.float64)
+    for name, values in features.items():
+        score += weights.get(name, 0.0) * _zscore(values)
+    return score
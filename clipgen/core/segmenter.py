@@ -1,5 +1,11 @@
-def words_to_sentences(words):
-    sentences = []
+from collections import deque
+
+import numpy as np
+
+from clipgen.core.words import as_word_store
+
+
+def iter_sentences(words):
     current = []
     start_time = None
 
@@ -10,35 +16,142 @@ def words_to_sentences(words):
         current.append(w)
 
         if w["text"].endswith((".", "!", "?")):
-            sentences.append({
+            yield {
                 "start": start_time,
                 "end": w["end"],
                 "text": " ".join(x["text"] for x in current)
-            })
+            }
             current = []
             start_time = None
 
     if current:
-        sentences.append({
+        yield {
             "start": start_time if start_time is not None else current[0]["start"],
             "end": current[-1]["end"],
             "text": " ".join(x["text"] for x in current)
-        })
+        }
+
+
+class Sentences:
+    # Sentences as contiguous word-index runs over a WordStore; text is sliced on demand
+
+    def __init__(self, store, first, last):
+        self.store = store
+        self.first = first
+        self.last = last
+        self.starts = store.starts[first]
+        self.ends = store.ends[last]
+
+    @classmethod
+    def from_dicts(cls, sentences):
+        # Treat each sentence as one "word" so joins still come from one buffer
+        store = as_word_store(list(sentences))
+        idx = np.arange(len(store))
+        return cls(store, idx, idx)
+
+    def __len__(self):
+        return len(self.first)
+
+    def join(self, i: int, j: int) -> str:
+        # Text of sentences i..j-1, as " ".join of their texts
+        if j <= i:
+            return ""
+        return self.store.join(self.first[i], self.last[j - 1] + 1)
+
+    def __getitem__(self, i: int):
+        return {"start": float(self.starts[i]), "end": float(self.ends[i]), "text": self.join(i, i + 1)}
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+def words_to_sentences(words) -> Sentences:
+    # Vectorised over the word store; iter_sentences() is the streaming form
+    store = as_word_store(words)
+    n = len(store)
+    if not n:
+        empty = np.zeros(0, dtype=np.int64)
+        return Sentences(store, empty, empty)
+
+    last = np.flatnonzero(store.sentence_end)
+    if not len(last) or last[-1] != n - 1:
+        last = np.append(last, n - 1)
+    first = np.concatenate(([0], last[:-1] + 1))
+
+    return Sentences(store, first, last)
+
+
+def iter_blocks(sentences, block_size=3):
+    window = deque(maxlen=block_size)
+
+    for i, s in enumerate(sentences):
+        window.append(s)
+        if len(window) == block_size:
+            yield {
+                "start": window[0]["start"],
+                "end": window[-1]["end"],
+                "text": " ".join(x["text"] for x in window),
+                "index": i - block_size + 1
+            }
+
+
+class Block:
+    # One window of a BlockView; reads like the old block dict, text built only if asked for
+    __slots__ = ("view", "i")
+
+    def __init__(self, view, i: int):
+        self.view = view
+        self.i = i
+
+    def __getitem__(self, key):
+        if key == "start":
+            return float(self.view.starts[self.i])
+        if key == "end":
+            return float(self.view.ends[self.i])
+        if key == "text":
+            return self.view.text(self.i)
+        if key == "index":
+            return self.i
+        raise KeyError(key)
+
+    def to_dict(self):
+        return {k: self[k] for k in ("start", "end", "text", "index")}
+
+
+class BlockView:
+    # All sliding windows of block_size sentences: start/end are array views,
+    # so memory is O(sentences) whatever the window size
+
+    def __init__(self, sentences: Sentences, block_size=3):
+        self.sentences = sentences
+        self.block_size = block_size
+        n = max(0, len(sentences) - block_size + 1)
+        self.starts = sentences.starts[:n]
+        self.ends = sentences.ends[block_size - 1:block_size - 1 + n]
+
+    def with_size(self, block_size: int):
+        return BlockView(self.sentences, block_size)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def text(self, i: int) -> str:
+        return self.sentences.join(i, i + self.block_size)
 
-    return sentences
+    def __getitem__(self, i: int):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return Block(self, i)
 
+    def __iter__(self):
+        for i in range(len(self)):
+            yield Block(self, i)
 
-def build_blocks(sentences, block_size=3):
-    blocks = []
-    if len(sentences) < block_size:
-        return blocks
 
-    for i in range(len(sentences) - block_size + 1):
-        chunk = sentences[i:i + block_size]
-        blocks.append({
-            "start": chunk[0]["start"],
-            "end": chunk[-1]["end"],
-            "text": " ".join(s["text"] for s in chunk),
-            "index": i
-        })
-    return blocks
+def build_blocks(sentences, block_size=3) -> BlockView:
+    if not isinstance(sentences, Sentences):
+        sentences = Sentences.from_dicts(sentences)
+    return BlockView(sentences, block_size)
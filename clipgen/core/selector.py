@@ -0,0 +1,48 @@
+from bisect import bisect_left
+
+import numpy as np
+
+
+def select_clips(starts, ends, count: int, min_distance: float = 45, scores=None, min_gap=None):
+    # Greedy pick of up to `count` candidate indices.
+    #   min_distance: selected starts must be at least this far apart
+    #   min_gap:      if set, selected [start, end] ranges must also be this far apart
+    #   scores:       best first; without scores candidates are taken in order
+    # Selected clips are kept sorted by start, so each check is a bisect plus
+    # a look at the two neighbours instead of a scan of everything selected.
+    starts = np.asarray(starts, dtype=np.float64)
+    ends = np.asarray(ends, dtype=np.float64)
+    if scores is None:
+        order = range(len(starts))
+    else:
+        order = np.argsort(-np.asarray(scores, dtype=np.float64), kind="stable")
+
+    picked = []
+    sel_starts = []
+    sel_ends = []
+
+    for i in order:
+        if len(picked) >= count:
+            break
+
+        s = starts[i]
+        e = ends[i]
+        pos = bisect_left(sel_starts, s)
+
+        if pos > 0 and s - sel_starts[pos - 1] < min_distance:
+            continue
+        if pos < len(sel_starts) and sel_starts[pos] - s < min_distance:
+            continue
+
+        if min_gap is not None:
+            # Selected ranges never overlap, so only the neighbours can clash
+            if pos > 0 and sel_ends[pos - 1] + min_gap > s:
+                continue
+            if pos < len(sel_starts) and e + min_gap > sel_starts[pos]:
+                continue
+
+        sel_starts.insert(pos, s)
+        sel_ends.insert(pos, e)
+        picked.append(int(i))
+
+    return picked
@@ -0,0 +1,124 @@
+import time
+from bisect import bisect_left, bisect_right
+
+import numpy as np
+
+from clipgen.core.renderer import clip_filename
+from clipgen.core.segmenter import iter_blocks, iter_sentences
+from clipgen.core.subtitles import generate_ass_for_range
+from clipgen.services.utils import log
+
+
+def stream_clips(
+    word_iter,
+    project_dir,
+    clip_count,
+    submit_render,
+    min_distance=45,
+    block_size=3,
+    pad=3,
+    tier="final",
+    score=None,
+    duration=None,
+    snap=None,
+    snap_tolerance=0.0,
+):
+    # Online form of the batch selection: blocks arrive in start order, so
+    # "at least min_distance from every selected block" only needs the last one.
+    # Without score the first blocks that fit are taken. With score(starts, ends, words)
+    # and the media duration, the timeline is cut into clip_count windows and each
+    # window's best-scoring block is taken once the transcript has passed it: the batch
+    # ranking, but per window instead of over the whole video, so picks are spread out.
+    # snap(start, end) -> (start, end) widens the padded edges by up to snap_tolerance.
+    # submit_render(idx, start, end, ass_file, out_file) -> Future
+    # Returns the rendered clips as (start, end, ass_file, out_file)
+    t0 = time.perf_counter()
+    word_iter = iter(word_iter)
+    words = []
+    # Running max of word starts, so slicing a clip's words stays a bisect even if
+    # Whisper emits a slightly out-of-order start (as WordStore.span does)
+    search = []
+    pending = []
+    futures = []
+    clips = []
+    first_clip = []
+    last_start = None
+    window = duration / clip_count if score is not None and duration and clip_count > 0 else None
+    candidates = []
+
+    def on_done(fut):
+        if not first_clip and fut.exception() is None:
+            first_clip.append(time.perf_counter() - t0)
+            log(f"Time to first clip: {first_clip[0]:.1f}s")
+
+    def finalize(b):
+        idx = len(futures) + 1
+        start = max(0, b["start"] - pad)
+        end = b["end"] + pad
+        if snap is not None:
+            start, end = snap(start, end)
+
+        ass_file = project_dir / f"{idx:02d}.ass"
+        out_file = project_dir / clip_filename(idx, tier)
+
+        # Only this clip's words: a store over the whole growing list per clip would be O(words x clips)
+        clip_words = words[bisect_left(search, start):bisect_right(search, end)]
+        generate_ass_for_range(clip_words, start, end, ass_file)
+        log(f"Clip {idx} selected after {time.perf_counter() - t0:.1f}s")
+        fut = submit_render(idx, start, end, ass_file, out_file)
+        fut.add_done_callback(on_done)
+        futures.append(fut)
+        clips.append((start, end, ass_file, out_file))
+
+    def tracked(it):
+        for w in it:
+            words.append(w)
+            search.append(max(search[-1], w["start"]) if search else w["start"])
+            # Subtitles need every word up to the padded (and snapped) end before a clip can render
+            while pending and w["start"] > pending[0]["end"] + pad + snap_tolerance:
+                finalize(pending.pop(0))
+            yield w
+
+    def pick_best():
+        # The finished window's best candidate among those far enough from the last pick
+        nonlocal last_start
+        fits = [b for b in candidates if last_start is None or b["start"] - last_start >= min_distance]
+        candidates.clear()
+        if not fits:
+            return
+        lo = bisect_left(search, fits[0]["start"])
+        hi = bisect_right(search, max(b["end"] for b in fits))
+        scores = score([b["start"] for b in fits], [b["end"] for b in fits], words[lo:hi])
+        b = fits[int(np.argmax(scores))]
+        pending.append(b)
+        last_start = b["start"]
+
+    for b in iter_blocks(iter_sentences(tracked(word_iter)), block_size):
+        if window is None:
+            if last_start is None or b["start"] - last_start >= min_distance:
+                pending.append(b)
+                last_start = b["start"]
+        else:
+            if candidates and b["start"] // window != candidates[0]["start"] // window:
+                pick_best()
+            candidates.append(b)
+        if len(futures) + len(pending) >= clip_count:
+            break
+    else:
+        # Transcript done: the last window is finished too
+        if candidates:
+            pick_best()
+
+    # Enough clips: read on only until the last one's padding is covered,
+    # then stop transcribing
+    for _ in tracked(word_iter):
+        if not pending:
+            break
+
+    while pending:
+        finalize(pending.pop(0))
+
+    for fut in futures:
+        fut.result()
+
+    return clips
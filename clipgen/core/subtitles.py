@@ -1,19 +1,18 @@
 from pathlib import Path
 
 from clipgen.config import SUB_MARGIN_V, VERT_H, VERT_W
+from clipgen.core.words import as_word_store
 from clipgen.services.utils import ts
 
 
 def generate_ass_for_range(words, start, end, ass_path: Path):
+    words = as_word_store(words)
     lines = []
 
-    for w in words:
-        if w["start"] < start or w["end"] > end:
-            continue
-
-        s = w["start"] - start
-        e = w["end"] - start
-        word = w["text"].upper().strip()
+    for i in words.indices_in(start, end):
+        s = words.starts[i] - start
+        e = words.ends[i] - start
+        word = words.word(i).upper().strip()
 
         styled = r"{\fscx80\fscy80\t(0,120,\fscx110\fscy110)\t(120,220,\fscx100\fscy100)}" + word
         lines.append(f"Dialogue: 0,{ts(s)},{ts(e)},Default,,0,0,0,,{styled}")
@@ -1,38 +1,425 @@
+import json
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+from multiprocessing import AuthenticationError, get_context
+from multiprocessing.connection import Client
 from pathlib import Path
 
+import numpy as np
+
+from clipgen.config import (
+    TRANSCRIBE_CHUNK_SECONDS,
+    TRANSCRIBE_DEADLINE,
+    TRANSCRIBE_THREADS,
+    TRANSCRIBE_WORKERS,
+    WHISPER_CALIBRATION_FILE,
+    WHISPER_DEVICE,
+    WHISPER_DEVICE_FILE,
+    WHISPER_MODEL,
+    WORKER_AUTHKEY,
+    WORKER_HOST,
+    WORKER_PORT,
+)
+from clipgen.core.audio import SAMPLE_RATE, load_audio
+from clipgen.core.chunking import chunk_count, chunk_spans, split_points, stitch_chunks
+from clipgen.services.metrics import measured, record_usage
 from clipgen.services.status_service import update_status
+from clipgen.services.transcript_cache import cache_key, load_transcript, save_transcript
 from clipgen.services.utils import log
 from faster_whisper import WhisperModel
 
+COMPUTE_TYPES = {"cuda": "float16", "cpu": "int8"}
+
+# Least to most accurate; picking a calibrated setup prefers the later ones
+MODEL_SIZES = ("tiny", "base", "small", "medium", "large-v1", "large-v2", "large-v3")
+PRECISIONS = ("int8", "int8_float32", "int8_float16", "int8_bfloat16", "bfloat16", "float16", "float32")
+
+_models = {}
+# Held while a model loads, so concurrent jobs wanting it load it once
+_models_lock = threading.Lock()
+
+# Shared by chunked transcriptions; replaced when its settings change
+_pool = None
+_pool_key = None
+_pool_lock = threading.Lock()
+# Transcriptions currently mapping chunks on each pool
+_pool_users = {}
+# Model of a chunk worker process
+_chunk_model = None
+
+# Shorter media is transcribed in one piece
+_MIN_CHUNKED_SECONDS = 120
+
+
+def whisper_device():
+    if WHISPER_DEVICE in COMPUTE_TYPES:
+        return WHISPER_DEVICE, COMPUTE_TYPES[WHISPER_DEVICE]
+
+    if WHISPER_DEVICE_FILE.exists():
+        try:
+            d = json.loads(WHISPER_DEVICE_FILE.read_text(encoding="utf-8"))
+            return d["device"], d["compute_type"]
+        except Exception:
+            pass
+
+    return "cuda", COMPUTE_TYPES["cuda"]
+
 
-def load_whisper_model():
+def _remember_device(device: str, compute_type: str):
+    WHISPER_DEVICE_FILE.write_text(
+        json.dumps({"device": device, "compute_type": compute_type}),
+        encoding="utf-8"
+    )
+
+
+def _rank(name: str, order) -> int:
+    # ".en" models rank with their multilingual size; unknown names rank lowest
+    name = name.removesuffix(".en")
+    return order.index(name) if name in order else -1
+
+
+def choose_config(media_seconds: float, chunked: bool = True):
+    # Most accurate calibrated setup expected to transcribe media_seconds within
+    # TRANSCRIBE_DEADLINE, else the fastest one. None without a calibration:
+    # WHISPER_MODEL on the probed device, as before. chunked=False for callers that
+    # always transcribe in one process (streaming).
+    if TRANSCRIBE_DEADLINE <= 0:
+        return None
     try:
-        log("Using CUDA Whisper")
-        return WhisperModel("base", device="cuda", compute_type="float16")
+        results = json.loads(WHISPER_CALIBRATION_FILE.read_text(encoding="utf-8"))["results"]
+    except (FileNotFoundError, ValueError, KeyError):
+        return None
+    if not chunked or media_seconds < _MIN_CHUNKED_SECONDS:
+        # Not chunked, so only single-process speeds apply
+        results = [r for r in results if r["workers"] == 1]
+    if not results:
+        return None
+
+    def estimate(r):
+        return r["load_seconds"] + r["rtf"] * media_seconds
+
+    fits = [r for r in results if estimate(r) <= TRANSCRIBE_DEADLINE]
+    if fits:
+        config = max(
+            fits,
+            key=lambda r: (_rank(r["model"], MODEL_SIZES), _rank(r["compute_type"], PRECISIONS), -estimate(r)),
+        )
+    else:
+        config = min(results, key=estimate)
+    log(
+        f"Whisper setup for {media_seconds:.0f}s: {config['model']} {config['device']}/{config['compute_type']}, "
+        f"{config['workers']} x {config['threads']} thread(s), ~{estimate(config):.0f}s "
+        f"(deadline {TRANSCRIBE_DEADLINE:.0f}s)"
+    )
+    return config
+
+
+def _model_id(config):
+    # (model name, compute type) the transcript cache is keyed by
+    if config is None:
+        return WHISPER_MODEL, whisper_device()[1]
+    return config["model"], config["compute_type"]
+
+
+def _job_config(audio, chunked: bool = True):
+    # Calibrated setup for a job's decoded audio; None when its length is unknown
+    if audio is None:
+        return None
+    return choose_config(len(load_audio(audio)) / SAMPLE_RATE, chunked)
+
+
+def _load_calibrated(config):
+    # In-process use of a setup gets every thread its workers would have had
+    threads = config["threads"] * config["workers"]
+    key = (config["model"], config["device"], config["compute_type"], threads)
+    model = _models.get(key)
+    if model is not None:
+        return model
+
+    with _models_lock:
+        model = _models.get(key)
+        if model is not None:
+            return model
+
+        t0 = time.perf_counter()
+        # One calibrated model resident at a time; the probed default stays. A job still
+        # using an evicted model keeps its own reference.
+        for k in [k for k in _models if isinstance(k, tuple)]:
+            del _models[k]
+        model = WhisperModel(
+            config["model"], device=config["device"], compute_type=config["compute_type"], cpu_threads=threads
+        )
+        log(f"Using {config['device'].upper()} Whisper ({config['model']}, {config['compute_type']}, "
+            f"loaded in {time.perf_counter() - t0:.1f}s)")
+        _models[key] = model
+        return model
+
+
+def load_whisper_model(model_name: str = WHISPER_MODEL, config=None):
+    # config: a calibrated setup from choose_config(); otherwise model_name on the probed device
+    if config is not None:
+        return _load_calibrated(config)
+
+    model = _models.get(model_name)
+    if model is not None:
+        return model
+
+    with _models_lock:
+        model = _models.get(model_name)
+        if model is not None:
+            return model
+        return _load_default(model_name)
+
+
+def _load_default(model_name: str):
+    t0 = time.perf_counter()
+    probed = whisper_device()
+    device, compute_type = probed
+    try:
+        model = WhisperModel(model_name, device=device, compute_type=compute_type)
     except Exception:
-        log("Using CPU Whisper")
-        return WhisperModel("base", device="cpu", compute_type="int8")
+        if device == "cpu":
+            raise
+        device, compute_type = "cpu", COMPUTE_TYPES["cpu"]
+        model = WhisperModel(model_name, device=device, compute_type=compute_type)
 
+    # Skip the failing CUDA probe on the next cold start
+    if (device, compute_type) != probed or not WHISPER_DEVICE_FILE.exists():
+        _remember_device(device, compute_type)
+
+    log(f"Using {device.upper()} Whisper ({model_name}, loaded in {time.perf_counter() - t0:.1f}s)")
+    _models[model_name] = model
+    return model
 
-def transcribe_words(video_path: Path, language="auto"):
-    update_status("Transkriberer...", 25, True)
-    model = load_whisper_model()
+
+def _iter_words(media, language="auto", config=None):
+    # media: a media file, a decoded .npy audio buffer, or the array itself
+    model = load_whisper_model(config=config)
 
     kwargs = dict(word_timestamps=True)
     if language != "auto":
         kwargs["language"] = language
 
-    segments, _ = model.transcribe(str(video_path), **kwargs)
+    if isinstance(media, np.ndarray) or str(media).endswith(".npy"):
+        media = load_audio(media)
+    else:
+        media = str(media)
 
-    words = []
+    # faster-whisper decodes lazily: words come out as segments finish
+    segments, _ = model.transcribe(media, **kwargs)
+    yield from _segment_words(segments)
+
+
+def _segment_words(segments):
     for s in segments:
         for w in s.words:
             if not w.word:
                 continue
-            words.append({
+            yield {
                 "start": float(w.start),
                 "end": float(w.end),
                 "text": w.word.strip()
+            }
+
+
+def _transcribe(media, language="auto", config=None):
+    return list(_iter_words(media, language, config))
+
+
+def _init_chunk_worker(model_name: str, compute_type: str, threads: int, device: str = "cpu"):
+    global _chunk_model
+    _chunk_model = WhisperModel(
+        model_name, device=device, compute_type=compute_type, cpu_threads=threads, num_workers=1
+    )
+
+
+def _chunk_audio(audio_path: str, a: int, b: int) -> np.ndarray:
+    # Workers page in only their own span of the memory-mapped buffer
+    return np.array(load_audio(audio_path)[a:b])
+
+
+def _detect_language(audio_path: str, a: int, b: int) -> str:
+    language, _, _ = _chunk_model.detect_language(_chunk_audio(audio_path, a, b))
+    return language
+
+
+def _transcribe_chunk(audio_path: str, a: int, b: int, language: str):
+    segments, _ = _chunk_model.transcribe(
+        _chunk_audio(audio_path, a, b), language=language, word_timestamps=True
+    )
+    return list(_segment_words(segments))
+
+
+@contextmanager
+def _chunk_pool(model_name: str, compute_type: str, workers: int, threads: int):
+    # The shared pool for these settings, held for one transcription. A job with other
+    # settings replaces it; a replaced pool is shut down once its last user is done.
+    global _pool, _pool_key
+    key = (model_name, compute_type, workers, threads)
+    retired = None
+    with _pool_lock:
+        if _pool_key != key:
+            if _pool is not None and not _pool_users.get(_pool):
+                retired = _pool
+            # spawn: forking a process that runs server threads is not safe
+            _pool = ProcessPoolExecutor(
+                workers,
+                mp_context=get_context("spawn"),
+                initializer=_init_chunk_worker,
+                initargs=(model_name, compute_type, threads),
+            )
+            _pool_key = key
+        pool = _pool
+        _pool_users[pool] = _pool_users.get(pool, 0) + 1
+    if retired is not None:
+        retired.shutdown()
+
+    try:
+        yield pool
+    finally:
+        with _pool_lock:
+            _pool_users[pool] -= 1
+            idle = not _pool_users[pool]
+            if idle:
+                del _pool_users[pool]
+            retire = idle and pool is not _pool
+        if retire:
+            pool.shutdown()
+
+
+def _transcribe_chunked(media, language="auto", config=None):
+    # Chunks of the decoded audio across worker processes on CPU: TRANSCRIBE_WORKERS,
+    # or the calibrated setup's workers when it has more than one.
+    # Returns None when it does not apply, so the caller transcribes in one piece.
+    if config is None:
+        device, compute_type = whisper_device()
+        model_name, workers, threads = WHISPER_MODEL, TRANSCRIBE_WORKERS, TRANSCRIBE_THREADS
+    else:
+        device, compute_type = config["device"], config["compute_type"]
+        model_name, workers, threads = config["model"], config["workers"], config["threads"]
+        if workers < 2:
+            return None
+    if workers < 1 or device != "cpu" or not str(media).endswith(".npy"):
+        return None
+    audio = load_audio(media)
+    duration = len(audio) / SAMPLE_RATE
+    if duration < _MIN_CHUNKED_SECONDS:
+        return None
+
+    t0 = time.perf_counter()
+    cuts = split_points(audio, chunk_count(duration, workers, TRANSCRIBE_CHUNK_SECONDS))
+    spans = chunk_spans(cuts, len(audio))
+    path = str(Path(media).resolve())
+
+    with _chunk_pool(model_name, compute_type, workers, threads) as pool:
+        # Chunks may not agree on the language, so it is settled once up front
+        # Each task reports its own usage, since the pool processes outlive the job
+        if language == "auto":
+            head = min(len(audio), 30 * SAMPLE_RATE)
+            language, *usage = pool.submit(measured, _detect_language, path, 0, head).result()
+            record_usage("whisper_language", *usage)
+            log(f"Detected language: {language}")
+
+        futures = {
+            pool.submit(measured, _transcribe_chunk, path, a, b, language): i
+            for i, (a, b, _, _) in enumerate(spans)
+        }
+        results = [None] * len(spans)
+        for done, fut in enumerate(as_completed(futures), start=1):
+            i = futures[fut]
+            results[i], *usage = fut.result()
+            a, b = spans[i][:2]
+            record_usage("whisper_chunk", *usage, media_seconds=(b - a) / SAMPLE_RATE)
+            update_status(f"Transkriberer... ({done}/{len(spans)})", 25 + 19 * done // len(spans), True)
+
+    words = stitch_chunks([(a / SAMPLE_RATE, lo, hi, w) for (a, _, lo, hi), w in zip(spans, results)])
+    elapsed = time.perf_counter() - t0
+    log(
+        f"Transcribed {len(spans)} chunk(s) on {workers} worker(s) x {threads} thread(s) "
+        f"in {elapsed:.1f}s ({duration / elapsed:.1f}x real time)"
+    )
+    return words
+
+
+def _transcribe_via_worker(media, language="auto"):
+    if isinstance(media, np.ndarray) or WORKER_AUTHKEY is None:
+        # In-memory buffers are not shipped over the socket; without a key there is no worker
+        return None
+
+    try:
+        conn = Client((WORKER_HOST, WORKER_PORT), authkey=WORKER_AUTHKEY)
+    except (OSError, AuthenticationError):
+        return None
+
+    try:
+        with conn:
+            conn.send({
+                "op": "transcribe",
+                "path": str(Path(media).resolve()),
+                "language": language,
             })
+            res = conn.recv()
+    except (EOFError, OSError) as e:
+        # The worker died mid-request; the caller transcribes in-process
+        log(f"Whisper worker connection lost ({str(e) or type(e).__name__}); transcribing in-process")
+        return None
+
+    if not res.get("ok"):
+        raise RuntimeError(f"Whisper worker failed: {res.get('error')}")
+
+    record_usage("whisper_worker", res["transcribe_seconds"], res.get("cpu_seconds", 0.0), res.get("peak_rss_bytes"))
+    log(
+        f"Transcribed by worker in {res['transcribe_seconds']:.1f}s "
+        f"(warm, request #{res['requests']}; cold model load was {res['load_seconds']:.1f}s)"
+    )
+    return res["words"]
+
+
+def transcribe_words(video_path: Path, language="auto", audio=None):
+    # audio: optional decoded buffer (see clipgen.core.audio); the cache stays keyed by video_path
+    update_status("Transkriberer...", 25, True)
 
+    # Only a decoded buffer on disk is chunked; an in-memory one runs in this process
+    config = _job_config(audio, chunked=not isinstance(audio, np.ndarray))
+    key = cache_key(video_path, *_model_id(config), language)
+    words = load_transcript(key)
+    if words is not None:
+        log(f"Transcript cache hit ({len(words)} words)")
+        return words
+
+    media = video_path if audio is None else audio
+    words = _transcribe_chunked(media, language, config)
+    if words is None and config is None:
+        # The warm worker holds WHISPER_MODEL only
+        words = _transcribe_via_worker(media, language)
+    if words is None:
+        t0 = time.perf_counter()
+        words = _transcribe(media, language, config)
+        log(f"Transcribed in-process in {time.perf_counter() - t0:.1f}s")
+
+    # Re-key: the device probe may have fallen back while loading
+    save_transcript(cache_key(video_path, *_model_id(config), language), words)
     return words
+
+
+def iter_transcribed_words(video_path: Path, language="auto", audio=None):
+    # Streaming variant of transcribe_words(); runs in-process so words arrive as decoded
+    update_status("Transkriberer...", 25, True)
+
+    config = _job_config(audio, chunked=False)
+    key = cache_key(video_path, *_model_id(config), language)
+    words = load_transcript(key)
+    if words is not None:
+        log(f"Transcript cache hit ({len(words)} words)")
+        yield from words
+        return
+
+    words = []
+    for w in _iter_words(video_path if audio is None else audio, language, config):
+        words.append(w)
+        yield w
+
+    # Only reached when the caller consumed the whole transcript
+    save_transcript(cache_key(video_path, *_model_id(config), language), words)
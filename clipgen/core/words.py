@@ -0,0 +1,72 @@
+import numpy as np
+
+
+class WordStore:
+    # Columnar word list: start/end arrays plus one space-joined text buffer.
+    # Word i is text[offsets[i]:offsets[i + 1] - 1], so any run of words
+    # joins to a single slice of the buffer.
+
+    def __init__(self, starts, ends, text: str, offsets):
+        self.starts = starts
+        self.ends = ends
+        self.text = text
+        self.offsets = offsets
+        # Running max keeps searchsorted valid if Whisper emits a slightly out-of-order start
+        self._search = np.maximum.accumulate(starts) if len(starts) else starts
+        self.sentence_end = np.array(
+            [text[offsets[i + 1] - 2:offsets[i + 1] - 1] in (".", "!", "?") for i in range(len(starts))],
+            dtype=bool,
+        )
+
+    @classmethod
+    def from_words(cls, words):
+        n = len(words)
+        starts = np.fromiter((w["start"] for w in words), dtype=np.float64, count=n)
+        ends = np.fromiter((w["end"] for w in words), dtype=np.float64, count=n)
+        lengths = np.fromiter((len(w["text"]) + 1 for w in words), dtype=np.int64, count=n)
+        offsets = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        text = "".join(w["text"] + " " for w in words)
+        return cls(starts, ends, text, offsets)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def word(self, i: int) -> str:
+        return self.text[self.offsets[i]:self.offsets[i + 1] - 1]
+
+    def join(self, i0: int, i1: int) -> str:
+        # Words i0..i1-1 separated by single spaces
+        if i1 <= i0:
+            return ""
+        return self.text[self.offsets[i0]:self.offsets[i1] - 1]
+
+    def __getitem__(self, i: int):
+        return {"start": float(self.starts[i]), "end": float(self.ends[i]), "text": self.word(i)}
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def span(self, start: float, end: float):
+        # Candidate index range for words starting inside [start, end]
+        i0 = int(np.searchsorted(self._search, start, side="left"))
+        i1 = int(np.searchsorted(self._search, end, side="right"))
+        return i0, i1
+
+    def spans(self, starts, ends):
+        # span() for arrays of windows at once
+        return (
+            np.searchsorted(self._search, starts, side="left"),
+            np.searchsorted(self._search, ends, side="right"),
+        )
+
+    def indices_in(self, start: float, end: float):
+        # Words lying fully inside [start, end]
+        i0, i1 = self.span(start, end)
+        inside = (self.starts[i0:i1] >= start) & (self.ends[i0:i1] <= end)
+        return i0 + np.flatnonzero(inside)
+
+
+def as_word_store(words) -> WordStore:
+    return words if isinstance(words, WordStore) else WordStore.from_words(words)
@@ -0,0 +1,161 @@
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+from clipgen.config import MAX_CLIP_COUNT, OUTPUT_DIR, RENDER_TIER, RENDER_TIERS, STAGE_LIMITS
+from clipgen.services.jobs import JobQueue
+from clipgen.services.utils import log
+
+ITEM_OPTIONS = ("clip_count", "language", "tier")
+
+
+def _clip_count(value) -> int:
+    # A whole number (int or numeric string), clamped to 1..MAX_CLIP_COUNT as /start does
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ValueError(f"clip_count must be a whole number, not {value!r}")
+    try:
+        n = int(value)
+    except ValueError:
+        raise ValueError(f"clip_count must be a whole number, not {value!r}") from None
+    return min(max(n, 1), MAX_CLIP_COUNT)
+
+
+def read_manifest(path: Path, defaults):
+    # One item per line: a URL or local media path, or a JSON object with "url" and
+    # any of clip_count / language / tier. Blank lines and # comments are skipped.
+    # Bad lines come back with an "error" so the rest of the batch still runs.
+    items = []
+    for n, line in enumerate(path.read_text(encoding="utf-8").splitlines(), start=1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+
+        item = dict(defaults, line=n)
+        if not line.startswith("{"):
+            item["url"] = line
+            items.append(item)
+            continue
+
+        try:
+            data = json.loads(line)
+            item.update(data)
+            unknown = set(data) - {"url", *ITEM_OPTIONS}
+            if unknown:
+                raise ValueError(f"unknown option(s): {', '.join(sorted(unknown))}")
+            item["clip_count"] = _clip_count(item["clip_count"])
+            if not item.get("url"):
+                raise ValueError("no url")
+            if item["tier"] not in RENDER_TIERS:
+                raise ValueError(f"unknown tier {item['tier']!r}")
+        except (ValueError, TypeError) as e:
+            item["error"] = f"line {n}: {e}"
+        items.append(item)
+
+    return items
+
+
+def run_batch(items, workers: int = 0, limits=None):
+    # Items share one JobQueue, so downloads, transcription and renders of
+    # different items overlap within the per-stage limits
+    limits = limits or STAGE_LIMITS
+    # Enough jobs in flight to fill every stage slot, plus one downloading ahead
+    workers = workers or sum(limits.values()) + 1
+    queue = JobQueue(workers, limits)
+
+    t0 = time.time()
+    submitted = []
+    for item in items:
+        job = None
+        if "error" not in item:
+            # Manifests come from the operator, so they may list local files
+            job = queue.submit(item["url"], item["clip_count"], item["language"], item["tier"], allow_local=True)
+        submitted.append((item, job))
+    log(f"Batch: {sum(j is not None for _, j in submitted)} job(s), {workers} in flight, stage limits {limits}")
+
+    queue.join()
+    return _summary(submitted, t0, workers, limits)
+
+
+def _summary(submitted, t0: float, workers: int, limits):
+    results = []
+    stage_totals = {}
+    for item, job in submitted:
+        if job is None:
+            results.append({"line": item["line"], "url": item.get("url"), "state": "failed", "error": item["error"]})
+            continue
+
+        results.append({
+            "line": item["line"],
+            "url": job.url,
+            "clip_count": job.clip_count,
+            "language": job.language,
+            "tier": job.tier,
+            "state": job.state,
+            "project": job.project,
+            "clips": job.clips,
+            "error": job.error,
+            "seconds": round(job.finished - job.created, 2),
+            "stage_seconds": {k: round(v, 2) for k, v in job.stage_seconds.items()},
+        })
+        for name, secs in job.stage_seconds.items():
+            stage_totals[name] = stage_totals.get(name, 0) + secs
+
+    done = [r for r in results if r["state"] == "done"]
+    return {
+        "started": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(t0)),
+        "wall_seconds": round(time.time() - t0, 2),
+        "workers": workers,
+        "stage_limits": limits,
+        "items": len(results),
+        "done": len(done),
+        "failed": len(results) - len(done),
+        "clips": sum(r["clips"] for r in done),
+        # Time spent inside each stage (slot held), summed over items
+        "stage_seconds": {k: round(v, 2) for k, v in stage_totals.items()},
+        "results": results,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m clipgen.services.batch",
+        description="Generate clips for every URL or media file listed in a manifest.",
+    )
+    parser.add_argument("manifest", type=Path)
+    parser.add_argument("--clip-count", type=int, default=3)
+    parser.add_argument("--language", default="auto")
+    parser.add_argument("--tier", default=RENDER_TIER, choices=sorted(RENDER_TIERS))
+    parser.add_argument("--workers", type=int, default=0, help="jobs in flight (default: fills every stage slot)")
+    for name, n in STAGE_LIMITS.items():
+        parser.add_argument(f"--{name}", type=int, default=n, help=f"concurrent {name} stages (default {n})")
+    parser.add_argument("--summary", type=Path, help="summary JSON (default output/batch_<time>.json)")
+    args = parser.parse_args(argv)
+
+    defaults = {"clip_count": _clip_count(args.clip_count), "language": args.language, "tier": args.tier}
+    items = read_manifest(args.manifest, defaults)
+    limits = {name: getattr(args, name) for name in STAGE_LIMITS}
+
+    summary = run_batch(items, args.workers, limits)
+    summary["manifest"] = str(args.manifest)
+
+    out = args.summary or OUTPUT_DIR / f"batch_{time.strftime('%Y%m%d-%H%M%S')}.json"
+    out.write_text(json.dumps(summary, indent=2), encoding="utf-8")
+
+    for r in summary["results"]:
+        if r["state"] == "done":
+            stages = ", ".join(f"{k} {v:.1f}s" for k, v in r["stage_seconds"].items())
+            log(f"  ok   {r['url']} -> {r['project']} ({r['clips']} clip(s); {stages})")
+        else:
+            log(f"  FAIL {r['url']}: {r['error']}")
+    log(
+        f"Batch done in {summary['wall_seconds']:.1f}s: {summary['done']} ok, "
+        f"{summary['failed']} failed, {summary['clips']} clip(s). Summary: {out}"
+    )
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    # python -m clipgen.services.batch manifest.txt [--clip-count 3] [--tier preview] ...
+    sys.exit(main())
@@ -0,0 +1,194 @@
+import queue
+import shutil
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from functools import partial
+
+from clipgen.config import JOB_WORKERS, OUTPUT_DIR, RENDER_TIER, STAGE_LIMITS, WORK_DIR
+from clipgen.core.pipeline import render_final, run_job
+from clipgen.services.status_service import bind_status
+from clipgen.services.utils import log
+
+# Finished jobs kept for the job list
+JOB_HISTORY = 100
+
+
+class Job:
+    def __init__(
+        self, url: str, clip_count: int, language: str, tier: str = RENDER_TIER, clip=None, allow_local=False
+    ):
+        self.id = uuid.uuid4().hex[:10]
+        self.url = url
+        # url may name a local media file; only set by trusted callers
+        self.allow_local = allow_local
+        self.clip_count = clip_count
+        self.language = language
+        self.tier = tier
+        # Set for a final render of one clip of an existing project
+        self.clip = clip
+        self.state = "queued"
+        self.stage = None
+        self.message = "I kø..."
+        self.progress = 0
+        self.project = None
+        self.clips = 0
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+        self.stage_seconds = {}
+        self.on_change = None
+
+    @property
+    def working(self):
+        return self.state not in ("done", "failed")
+
+    def set_status(self, message: str, progress: int, working: bool):
+        self.message = message
+        self.progress = progress
+        self.changed()
+
+    def changed(self):
+        if self.on_change is not None:
+            self.on_change()
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "url": self.url,
+            "clip_count": self.clip_count,
+            "language": self.language,
+            "tier": self.tier,
+            "clip": self.clip,
+            "state": self.state,
+            "stage": self.stage,
+            "message": self.message,
+            "progress": self.progress,
+            "working": self.working,
+            "project": self.project,
+            "clips": self.clips,
+            "error": self.error,
+            "created": self.created,
+            "finished": self.finished,
+            "stage_seconds": self.stage_seconds,
+        }
+
+
+class JobQueue:
+    def __init__(self, workers: int = JOB_WORKERS, limits=None):
+        self._queue = queue.Queue()
+        self._jobs = {}
+        self._lock = threading.Lock()
+        # Bumped on every job change; server-sent event streams wait on it
+        self._changed = threading.Condition()
+        self._version = 0
+        # One slot pool per stage: a long Whisper run cannot hold up renders
+        self._limits = {
+            name: threading.BoundedSemaphore(max(1, n))
+            for name, n in (limits or STAGE_LIMITS).items()
+        }
+
+        for _ in range(max(1, workers)):
+            threading.Thread(target=self._worker, daemon=True).start()
+
+    def submit(
+        self, url: str, clip_count: int = 3, language: str = "auto", tier: str = RENDER_TIER, allow_local=False
+    ) -> Job:
+        return self._enqueue(Job(url, clip_count, language, tier, allow_local=allow_local))
+
+    def submit_final(self, project: str, idx: int) -> Job:
+        # Full-quality encode of one previewed clip
+        job = Job(f"{project} #{idx}", 1, "auto", "final", clip=idx)
+        job.project = project
+        return self._enqueue(job)
+
+    def _enqueue(self, job: Job) -> Job:
+        job.on_change = self._notify
+        with self._lock:
+            self._jobs[job.id] = job
+            self._trim()
+        self._queue.put(job)
+        self._notify()
+        log(f"Job {job.id} queued ({self._queue.qsize()} waiting)")
+        return job
+
+    def get(self, job_id: str):
+        return self._jobs.get(job_id)
+
+    def jobs(self):
+        with self._lock:
+            return [j.to_dict() for j in reversed(list(self._jobs.values()))]
+
+    def join(self):
+        # Block until every submitted job has finished
+        self._queue.join()
+
+    def wait(self, version, timeout: float = 15):
+        # Block until the job list differs from `version`; returns the current version
+        with self._changed:
+            self._changed.wait_for(lambda: self._version != version, timeout)
+            return self._version
+
+    def _notify(self):
+        with self._changed:
+            self._version += 1
+            self._changed.notify_all()
+
+    def _trim(self):
+        finished = [j for j in self._jobs.values() if not j.working]
+        for j in finished[:max(0, len(finished) - JOB_HISTORY)]:
+            del self._jobs[j.id]
+
+    @contextmanager
+    def _stage(self, job: Job, name: str):
+        job.stage = name
+        job.state = "waiting"
+        job.changed()
+        with self._limits[name]:
+            job.state = "running"
+            job.changed()
+            t0 = time.perf_counter()
+            try:
+                yield
+            finally:
+                job.stage_seconds[name] = job.stage_seconds.get(name, 0) + time.perf_counter() - t0
+
+    def _worker(self):
+        while True:
+            job = self._queue.get()
+            self._run(job)
+            self._queue.task_done()
+
+    def _run(self, job: Job):
+        work_dir = WORK_DIR / "jobs" / job.id
+        bind_status(job.set_status)
+        try:
+            if job.clip is not None:
+                render_final(OUTPUT_DIR / job.project, job.clip, partial(self._stage, job))
+                n = 1
+            else:
+                project_dir, n = run_job(
+                    job.url,
+                    job.clip_count,
+                    job.language,
+                    work_dir,
+                    partial(self._stage, job),
+                    job.tier,
+                    job.allow_local,
+                )
+                job.project = project_dir.name
+            job.clips = n
+            job.state = "done"
+            job.set_status("Ferdig!" if n else "Fant ingen blokker.", 100 if n else 0, False)
+        except Exception as e:
+            log(f"Job {job.id} failed: {e}")
+            job.error = str(e)[-500:]
+            job.state = "failed"
+            job.set_status("Feil oppstod", 0, False)
+        finally:
+            bind_status(None)
+            job.stage = None
+            job.finished = time.time()
+            job.changed()
+            shutil.rmtree(work_dir, ignore_errors=True)
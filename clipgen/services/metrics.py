@@ -0,0 +1,383 @@
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows: no rusage, so no peak RSS or child CPU
+    resource = None
+
+_local = threading.local()
+_totals = {}
+_totals_lock = threading.Lock()
+
+# ru_maxrss is in KB on Linux, bytes on macOS
+_RSS_UNIT = 1 if sys.platform == "darwin" else 1024
+
+
+try:
+    _PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+except (AttributeError, ValueError, OSError):
+    _PAGE_SIZE = 4096
+
+
+def _peak_rss():
+    # Lifetime high-water mark of this process
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * _RSS_UNIT
+
+
+def _current_rss():
+    # Resident set size right now (Linux); None elsewhere
+    try:
+        with open("/proc/self/statm", encoding="ascii") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def child_peak_rss(pid: int):
+    # High-water RSS of a running child since its exec (Linux); None once it has exited.
+    # Preferred to the child's ru_maxrss, which Linux floors at the parent's RSS when it
+    # was started, so a small ffmpeg under a large web process reports the latter.
+    try:
+        with open(f"/proc/{pid}/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def rss_mark():
+    return _peak_rss(), _current_rss()
+
+
+def rss_since(mark):
+    # Peak RSS since rss_mark(): exact when the process reached a new high-water mark in
+    # between, otherwise the larger of the current RSS at both ends. The lifetime maximum
+    # alone would repeat the first heavy stage's peak in every later one.
+    peak0, current0 = mark
+    peak = _peak_rss()
+    if peak is not None and peak0 is not None and peak > peak0:
+        return peak
+    samples = [r for r in (current0, _current_rss()) if r is not None]
+    return max(samples) if samples else peak
+
+
+class JobMetrics:
+    # Spans recorded for one job; saved as metrics.json in its project dir
+
+    def __init__(self):
+        self.media_seconds = None
+        self.spans = []
+        # Where run_job() saves these, once the project dir exists
+        self.path = None
+        # Set on a failed run: its source and the error it stopped on
+        self.url = None
+        self.error = None
+        self._lock = threading.Lock()
+        # (cpu seconds, peak rss) of each child process or worker task recorded so far,
+        # folded into the spans enclosing them
+        self.children = []
+
+    def add(self, record):
+        with self._lock:
+            self.spans.append(record)
+
+    def add_child(self, cpu: float, rss: int):
+        with self._lock:
+            self.children.append((cpu, rss))
+
+    def children_since(self, n: int):
+        with self._lock:
+            return self.children[n:]
+
+    def stages(self):
+        out = {}
+        for s in self.spans:
+            agg = out.setdefault(s["stage"], {"count": 0, "wall_seconds": 0.0, "cpu_seconds": 0.0,
+                                              "media_seconds": 0.0, "peak_rss_bytes": None})
+            agg["count"] += 1
+            agg["wall_seconds"] += s["wall_seconds"]
+            agg["cpu_seconds"] += s["cpu_seconds"]
+            agg["media_seconds"] += s["media_seconds"] or 0.0
+            if "frames" in s:
+                agg["frames"] = agg.get("frames", 0) + s["frames"]
+            if s["peak_rss_bytes"] is not None:
+                agg["peak_rss_bytes"] = max(agg["peak_rss_bytes"] or 0, s["peak_rss_bytes"])
+        for agg in out.values():
+            # Real-time factor: processing seconds per second of media (< 1 is faster than real time)
+            agg["realtime_factor"] = agg["wall_seconds"] / agg["media_seconds"] if agg["media_seconds"] else None
+            if "frames" in agg:
+                agg["encode_fps"] = agg["frames"] / agg["wall_seconds"] if agg["wall_seconds"] else None
+        return out
+
+    def to_dict(self):
+        data = {"media_seconds": self.media_seconds, "stages": self.stages(), "spans": self.spans}
+        if self.error is not None:
+            data.update(url=self.url, error=self.error)
+        return data
+
+    @classmethod
+    def load(cls, path: Path):
+        # Earlier spans of a project, so later work (final renders) appends to them
+        metrics = cls()
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            return metrics
+        metrics.media_seconds = data.get("media_seconds")
+        metrics.spans = data.get("spans") or []
+        return metrics
+
+    def save(self, path: Path):
+        tmp = path.with_suffix(f".tmp{os.getpid()}")
+        tmp.write_text(json.dumps(self.to_dict(), indent=2), encoding="utf-8")
+        os.replace(tmp, path)
+
+
+def bind_metrics(metrics):
+    # Record this thread's spans into `metrics`; pass None to unbind
+    _local.metrics = metrics
+
+
+def current_metrics():
+    return getattr(_local, "metrics", None)
+
+
+def carry_metrics(fn):
+    # Wrap fn for a worker thread so its spans land in the caller's job
+    metrics = current_metrics()
+
+    def run(*args, **kwargs):
+        bind_metrics(metrics)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            bind_metrics(None)
+
+    return run
+
+
+def set_media_seconds(seconds: float):
+    # The job's media duration, known once audio is decoded; spans recorded before
+    # that (the download) get it too
+    metrics = current_metrics()
+    if metrics is None:
+        return
+    with metrics._lock:
+        metrics.media_seconds = seconds
+        for record in metrics.spans:
+            if record["media_seconds"] is None:
+                record["media_seconds"] = seconds
+
+
+@contextmanager
+def span(stage: str, media_seconds: float = None, **labels):
+    # Wall time, CPU time and peak RSS of one stage. CPU is this process's (all threads,
+    # so overlapping jobs share it) plus the child processes and worker tasks recorded
+    # inside the span; peak RSS is the largest of this process's over the span and theirs.
+    # media_seconds defaults to the job's media duration, for real-time factors.
+    metrics = current_metrics()
+    child0 = len(metrics.children) if metrics is not None else 0
+    mark = rss_mark()
+    wall0 = time.perf_counter()
+    cpu0 = time.process_time()
+    try:
+        yield
+    finally:
+        wall = time.perf_counter() - wall0
+        cpu = time.process_time() - cpu0
+        rss = rss_since(mark)
+        if metrics is not None:
+            children = metrics.children_since(child0)
+            cpu += sum(c for c, _ in children)
+            rss = max([r for r in [rss, *(r for _, r in children)] if r is not None], default=None)
+            if media_seconds is None:
+                media_seconds = metrics.media_seconds
+
+        record = {
+            "stage": stage,
+            "wall_seconds": round(wall, 4),
+            "cpu_seconds": round(cpu, 4),
+            "peak_rss_bytes": rss,
+            "media_seconds": media_seconds,
+            **labels,
+        }
+        if metrics is not None:
+            metrics.add(record)
+        _add_total(record)
+
+
+def record_child(stage: str, wall: float, rusage, media_seconds: float = None, peak_rss: int = None, **labels):
+    # One finished child process (e.g. an ffmpeg render), with its exact rusage when known.
+    # peak_rss: the last child_peak_rss() sample, when the child ran long enough for one.
+    cpu = rusage.ru_utime + rusage.ru_stime if rusage is not None else 0.0
+    rss = rusage.ru_maxrss * _RSS_UNIT if rusage is not None else None
+    if peak_rss is not None:
+        rss = peak_rss
+    record_usage(stage, wall, cpu, rss, media_seconds, **labels)
+
+
+def record_usage(stage: str, wall: float, cpu: float, rss, media_seconds: float = None, **labels):
+    # Work done outside this process, measured where it ran (a worker process's task)
+    metrics = current_metrics()
+    if metrics is not None:
+        metrics.add_child(cpu, rss)
+
+    record = {
+        "stage": stage,
+        "wall_seconds": round(wall, 4),
+        "cpu_seconds": round(cpu, 4),
+        "peak_rss_bytes": rss,
+        "media_seconds": media_seconds,
+        **labels,
+    }
+    if metrics is not None:
+        metrics.add(record)
+    _add_total(record)
+
+
+def wait_child(proc, timeout: float = None):
+    # proc.wait() that reaps with wait4() for the child's own rusage (None where
+    # unavailable). Raises subprocess.TimeoutExpired like proc.wait().
+    if not hasattr(os, "wait4") or proc.returncode is not None:
+        proc.wait(timeout)
+        return None
+
+    deadline = None if timeout is None else time.monotonic() + timeout
+    delay = 0.0005
+    try:
+        while True:
+            pid, status, rusage = os.wait4(proc.pid, 0 if deadline is None else os.WNOHANG)
+            if pid:
+                break
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise subprocess.TimeoutExpired(proc.args, timeout)
+            delay = min(delay * 2, remaining, 0.05)
+            time.sleep(delay)
+    except ChildProcessError:
+        # Reaped elsewhere (subprocess internals); the exit status is still on proc
+        proc.wait()
+        return None
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    return rusage
+
+
+def run_child(cmd, stage: str, media_seconds: float = None, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+              **labels):
+    # subprocess.run(cmd, text=True) that records the child's CPU and peak RSS under `stage`
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(cmd, stdout=stdout, stderr=stderr, text=True)
+    out = {}
+
+    def drain(name, pipe):
+        out[name] = pipe.read()
+        pipe.close()
+
+    readers = [
+        threading.Thread(target=drain, args=(name, pipe), daemon=True)
+        for name, pipe in (("stdout", proc.stdout), ("stderr", proc.stderr))
+        if pipe is not None
+    ]
+    for r in readers:
+        r.start()
+    peak = None
+    while True:
+        try:
+            rusage = wait_child(proc, timeout=0.2)
+            break
+        except subprocess.TimeoutExpired:
+            peak = child_peak_rss(proc.pid) or peak
+    for r in readers:
+        r.join()
+    record_child(stage, time.perf_counter() - t0, rusage, media_seconds, peak, **labels)
+    return subprocess.CompletedProcess(cmd, proc.returncode, out.get("stdout"), out.get("stderr"))
+
+
+def measured(fn, *args):
+    # Runs fn(*args) in a worker process and returns (result, wall, cpu, peak rss) for
+    # record_usage() in the caller; the worker runs one task at a time
+    mark = rss_mark()
+    wall0 = time.perf_counter()
+    cpu0 = time.process_time()
+    result = fn(*args)
+    return result, time.perf_counter() - wall0, time.process_time() - cpu0, rss_since(mark)
+
+
+def _add_total(record):
+    with _totals_lock:
+        t = _totals.setdefault(record["stage"], {"count": 0, "wall_seconds": 0.0, "cpu_seconds": 0.0,
+                                                 "media_seconds": 0.0, "peak_rss_bytes": 0})
+        t["count"] += 1
+        t["wall_seconds"] += record["wall_seconds"]
+        t["cpu_seconds"] += record["cpu_seconds"]
+        t["media_seconds"] += record["media_seconds"] or 0.0
+        if "frames" in record:
+            t["frames"] = t.get("frames", 0) + record["frames"]
+        t["peak_rss_bytes"] = max(t["peak_rss_bytes"], record["peak_rss_bytes"] or 0)
+
+
+def stage_totals():
+    # Process-wide aggregates since start, per stage
+    with _totals_lock:
+        return {name: dict(t) for name, t in _totals.items()}
+
+
+def _fmt(value) -> str:
+    # Integers (bytes, counts) exactly; floats at full precision
+    return str(value) if isinstance(value, int) else repr(float(value))
+
+
+def prometheus_text(extra=()):
+    # Text exposition format; extra: (name, type, help, [(labels dict, value), ...])
+    totals = stage_totals()
+    families = [
+        ("clipgen_stage_runs_total", "counter", "Stage executions", "count"),
+        ("clipgen_stage_wall_seconds_total", "counter", "Wall time spent in each stage", "wall_seconds"),
+        ("clipgen_stage_cpu_seconds_total", "counter", "CPU time spent in each stage", "cpu_seconds"),
+        ("clipgen_stage_media_seconds_total", "counter", "Seconds of media processed by each stage", "media_seconds"),
+        ("clipgen_stage_peak_rss_bytes", "gauge", "Highest peak RSS of one run of each stage", "peak_rss_bytes"),
+    ]
+
+    lines = []
+    for name, kind, help_text, field in families:
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+        for stage, t in sorted(totals.items()):
+            lines.append(f'{name}{{stage="{stage}"}} {_fmt(t[field])}')
+
+    lines += ["# HELP clipgen_stage_realtime_factor Wall seconds per media second",
+              "# TYPE clipgen_stage_realtime_factor gauge"]
+    for stage, t in sorted(totals.items()):
+        if t["media_seconds"]:
+            lines.append(f'clipgen_stage_realtime_factor{{stage="{stage}"}} {_fmt(t["wall_seconds"] / t["media_seconds"])}')
+
+    lines += ["# HELP clipgen_stage_frames_total Video frames encoded by each stage",
+              "# TYPE clipgen_stage_frames_total counter"]
+    for stage, t in sorted(totals.items()):
+        if "frames" in t:
+            lines.append(f'clipgen_stage_frames_total{{stage="{stage}"}} {t["frames"]}')
+
+    # A host that throttles shows up as falling encode fps at the same settings
+    lines += ["# HELP clipgen_stage_encode_fps Frames encoded per wall second",
+              "# TYPE clipgen_stage_encode_fps gauge"]
+    for stage, t in sorted(totals.items()):
+        if t.get("frames") and t["wall_seconds"]:
+            lines.append(f'clipgen_stage_encode_fps{{stage="{stage}"}} {_fmt(t["frames"] / t["wall_seconds"])}')
+
+    for name, kind, help_text, samples in extra:
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+        for labels, value in samples:
+            label_text = ",".join(f'{k}="{v}"' for k, v in labels.items())
+            lines.append(f"{name}{{{label_text}}} {_fmt(value)}" if label_text else f"{name} {_fmt(value)}")
+
+    return "\n".join(lines) + "\n"
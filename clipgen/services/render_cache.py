@@ -0,0 +1,145 @@
+import hashlib
+import json
+import os
+import shutil
+import sys
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+from clipgen.config import RENDER_CACHE_DIR, RENDER_CACHE_MAX_BYTES
+from clipgen.services.utils import file_hash, log
+
+_STATS_FILE = RENDER_CACHE_DIR / "stats.json"
+_lock = threading.Lock()
+_enabled = RENDER_CACHE_MAX_BYTES > 0
+
+
+def render_key(video_path: Path, start: float, end: float, ass_file: Path, args) -> str:
+    # args: the ffmpeg arguments with per-run file names left out, so equal inputs give equal keys
+    h = hashlib.blake2b(digest_size=16)
+    h.update(file_hash(video_path).encode("ascii"))
+    h.update(f"|{start:.3f}|{end:.3f}|".encode("ascii"))
+    h.update(Path(ass_file).read_bytes())
+    h.update("\x00".join(str(a) for a in args).encode("utf-8"))
+    return h.hexdigest()
+
+
+def _link(src: Path, dst: Path):
+    # Hardlink when cache and project share a filesystem, copy otherwise
+    if dst.exists() and os.path.samefile(src, dst):
+        # Already linked; rename() between two links to one file would leave tmp behind
+        return
+    tmp = dst.with_name(f".{dst.name}.tmp{os.getpid()}")
+    tmp.unlink(missing_ok=True)
+    try:
+        os.link(src, tmp)
+    except OSError:
+        shutil.copyfile(src, tmp)
+    os.replace(tmp, dst)
+
+
+def _count(field: str):
+    with _lock:
+        try:
+            stats = json.loads(_STATS_FILE.read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            stats = {"hits": 0, "misses": 0}
+        stats[field] = stats.get(field, 0) + 1
+        RENDER_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp = _STATS_FILE.with_suffix(f".tmp{os.getpid()}")
+        tmp.write_text(json.dumps(stats), encoding="utf-8")
+        os.replace(tmp, _STATS_FILE)
+
+
+def fetch_render(key: str, output_file: Path) -> bool:
+    # On a hit the cached clip is placed at output_file
+    if not _enabled:
+        return False
+
+    path = RENDER_CACHE_DIR / f"{key}.mp4"
+    try:
+        _link(path, output_file)
+    except FileNotFoundError:
+        _count("misses")
+        return False
+
+    # mtime doubles as the LRU clock
+    os.utime(path)
+    _count("hits")
+    return True
+
+
+def store_render(key: str, output_file: Path):
+    if not _enabled:
+        return
+    RENDER_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    _link(output_file, RENDER_CACHE_DIR / f"{key}.mp4")
+    _evict()
+
+
+def _evict(max_bytes: int = RENDER_CACHE_MAX_BYTES):
+    entries = []
+    for p in RENDER_CACHE_DIR.glob("*.mp4"):
+        try:
+            st = p.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((st.st_mtime, st.st_size, p))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, p in sorted(entries, key=lambda e: e[0]):
+        if total <= max_bytes:
+            break
+        # A hardlinked project copy keeps its data; only the cache entry goes
+        p.unlink(missing_ok=True)
+        total -= size
+
+
+@contextmanager
+def render_cache_disabled():
+    # Benchmarks need every render to reach ffmpeg
+    global _enabled
+    prev, _enabled = _enabled, False
+    try:
+        yield
+    finally:
+        _enabled = prev
+
+
+def render_cache_stats():
+    files = list(RENDER_CACHE_DIR.glob("*.mp4"))
+    try:
+        stats = json.loads(_STATS_FILE.read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        stats = {}
+    hits = stats.get("hits", 0)
+    misses = stats.get("misses", 0)
+    return {
+        "entries": len(files),
+        "bytes": sum(p.stat().st_size for p in files),
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+    }
+
+
+def clear_render_cache() -> int:
+    removed = 0
+    for p in RENDER_CACHE_DIR.glob("*.mp4"):
+        p.unlink(missing_ok=True)
+        removed += 1
+    _STATS_FILE.unlink(missing_ok=True)
+    return removed
+
+
+if __name__ == "__main__":
+    # python -m clipgen.services.render_cache [clear]
+    if len(sys.argv) >= 2 and sys.argv[1] == "clear":
+        log(f"Removed {clear_render_cache()} cached render(s)")
+    else:
+        s = render_cache_stats()
+        log(
+            f"{s['entries']} cached render(s), {s['bytes'] / 1024 / 1024:.1f} MB; "
+            f"{s['hits']} hit(s), {s['misses']} miss(es), hit rate {s['hit_rate']:.0%}"
+        )
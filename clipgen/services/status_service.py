@@ -1,10 +1,28 @@
 import json
+import os
+import threading
 
 from clipgen.config import STATUS_FILE
 
+_local = threading.local()
+
+
+def bind_status(callback):
+    # Route this thread's update_status() calls to callback(message, progress, working)
+    # instead of the shared status file; pass None to unbind
+    _local.callback = callback
+
 
 def update_status(message: str, progress: int, working: bool):
-    STATUS_FILE.write_text(
+    callback = getattr(_local, "callback", None)
+    if callback is not None:
+        callback(message, int(progress), bool(working))
+        return
+
+    # Standalone CLI runs: write-then-rename so readers never see a torn file
+    tmp = STATUS_FILE.with_suffix(f".tmp{os.getpid()}")
+    tmp.write_text(
         json.dumps({"message": message, "progress": int(progress), "working": bool(working)}),
         encoding="utf-8"
     )
+    os.replace(tmp, STATUS_FILE)
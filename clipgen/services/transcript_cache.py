@@ -0,0 +1,105 @@
+import hashlib
+import os
+import struct
+import sys
+import zlib
+from array import array
+from pathlib import Path
+
+from clipgen.config import TRANSCRIPT_CACHE_DIR, TRANSCRIPT_CACHE_MAX_BYTES
+from clipgen.services.utils import file_hash, log
+
+# File layout: magic, word count, then zlib(start/end float64 pairs + NUL-joined utf-8 text)
+_MAGIC = b"CGW1"
+
+
+def cache_key(media_path: Path, model_name: str, compute_type: str, language: str) -> str:
+    params = hashlib.blake2b(f"{model_name}|{compute_type}|{language}".encode("utf-8"), digest_size=8)
+    return f"{file_hash(media_path)}_{params.hexdigest()}"
+
+
+def _encode(words) -> bytes:
+    times = array("d")
+    for w in words:
+        times.append(w["start"])
+        times.append(w["end"])
+    text = "\x00".join(w["text"] for w in words).encode("utf-8")
+    return _MAGIC + struct.pack("<I", len(words)) + zlib.compress(times.tobytes() + text, 6)
+
+
+def _decode(data: bytes):
+    if data[:4] != _MAGIC:
+        raise ValueError("not a transcript cache file")
+
+    n = struct.unpack_from("<I", data, 4)[0]
+    raw = zlib.decompress(data[8:])
+    times = array("d")
+    times.frombytes(raw[:16 * n])
+    texts = raw[16 * n:].decode("utf-8").split("\x00") if n else []
+
+    return [
+        {"start": times[2 * i], "end": times[2 * i + 1], "text": texts[i]}
+        for i in range(n)
+    ]
+
+
+def load_transcript(key: str):
+    path = TRANSCRIPT_CACHE_DIR / f"{key}.words"
+    try:
+        words = _decode(path.read_bytes())
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        log(f"Dropping unreadable transcript cache entry {path.name}: {e}")
+        path.unlink(missing_ok=True)
+        return None
+
+    # mtime doubles as the LRU clock
+    os.utime(path)
+    return words
+
+
+def save_transcript(key: str, words):
+    TRANSCRIPT_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    path = TRANSCRIPT_CACHE_DIR / f"{key}.words"
+    tmp = path.with_suffix(f".tmp{os.getpid()}")
+    tmp.write_bytes(_encode(words))
+    os.replace(tmp, path)
+    _evict()
+
+
+def _evict(max_bytes: int = TRANSCRIPT_CACHE_MAX_BYTES):
+    entries = []
+    for p in TRANSCRIPT_CACHE_DIR.glob("*.words"):
+        try:
+            st = p.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((st.st_mtime, st.st_size, p))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, p in sorted(entries, key=lambda e: e[0]):
+        if total <= max_bytes:
+            break
+        p.unlink(missing_ok=True)
+        total -= size
+
+
+def clear_transcript_cache(media_path: Path = None) -> int:
+    pattern = f"{file_hash(media_path)}_*.words" if media_path else "*.words"
+    removed = 0
+    for p in TRANSCRIPT_CACHE_DIR.glob(pattern):
+        p.unlink(missing_ok=True)
+        removed += 1
+    return removed
+
+
+if __name__ == "__main__":
+    # python -m clipgen.services.transcript_cache clear [media_file]
+    if len(sys.argv) >= 2 and sys.argv[1] == "clear":
+        n = clear_transcript_cache(Path(sys.argv[2]) if len(sys.argv) > 2 else None)
+        log(f"Removed {n} cached transcript(s)")
+    else:
+        files = list(TRANSCRIPT_CACHE_DIR.glob("*.words"))
+        size = sum(p.stat().st_size for p in files)
+        log(f"{len(files)} cached transcript(s), {size / 1024 / 1024:.1f} MB")
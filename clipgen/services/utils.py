@@ -1,5 +1,5 @@
+import hashlib
 import re
-import subprocess
 from pathlib import Path
 
 from clipgen.config import OUTPUT_DIR
@@ -18,33 +18,17 @@ def safe_name(name: str, max_len: int = 80) -> str:
 
 
 def unique_project_dir(base_name: str) -> Path:
+    # mkdir without exist_ok claims the name atomically, so concurrent jobs never share a dir
+    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
     d = OUTPUT_DIR / base_name
-    if not d.exists():
-        d.mkdir(parents=True, exist_ok=True)
-        return d
-
     n = 2
     while True:
-        dd = OUTPUT_DIR / f"{base_name} ({n})"
-        if not dd.exists():
-            dd.mkdir(parents=True, exist_ok=True)
-            return dd
-        n += 1
-
-
-def get_youtube_title(url: str) -> str:
-    try:
-        res = subprocess.run(
-            ["yt-dlp", "--get-title", url],
-            capture_output=True,
-            text=True
-        )
-        title = (res.stdout or "").strip()
-        if title:
-            return title
-    except Exception:
-        pass
-    return "Project"
+        try:
+            d.mkdir()
+            return d
+        except FileExistsError:
+            d = OUTPUT_DIR / f"{base_name} ({n})"
+            n += 1
 
 
 def ts(seconds: float) -> str:
@@ -52,3 +36,22 @@ def ts(seconds: float) -> str:
     m = int((seconds % 3600) // 60)
     s = seconds % 60
     return f"{h}:{m:02d}:{s:05.2f}"
+
+
+_hash_memo = {}
+
+
+def file_hash(path: Path) -> str:
+    path = Path(path)
+    st = path.stat()
+    memo_key = (str(path.resolve()), st.st_size, st.st_mtime_ns)
+    if memo_key in _hash_memo:
+        return _hash_memo[memo_key]
+
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+
+    _hash_memo[memo_key] = h.hexdigest()
+    return _hash_memo[memo_key]
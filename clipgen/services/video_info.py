@@ -0,0 +1,136 @@
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+from pathlib import Path
+
+from clipgen.config import VIDEO_CACHE_DIR, VIDEO_CACHE_MAX_BYTES, VIDEO_INFO_TTL, YTDLP
+from clipgen.services.metrics import run_child
+from clipgen.services.utils import log
+
+# Format fields kept in the compact metadata
+_FORMAT_KEYS = ("format_id", "ext", "vcodec", "acodec", "width", "height", "fps", "tbr", "filesize")
+
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+def _url_ref(url: str) -> Path:
+    # URL -> cache key pointer, so a re-submission finds its entry without a probe
+    return VIDEO_CACHE_DIR / "urls" / f"{hashlib.blake2b(url.strip().encode('utf-8'), digest_size=12).hexdigest()}"
+
+
+def _video_key(info) -> str:
+    # Ids are only unique within one extractor (the generic one derives them from file
+    # names), so entries are keyed by both, made safe as a directory name
+    return re.sub(r"[^\w.-]", "_", f"{info.get('extractor_key') or 'unknown'}-{info['id']}")
+
+
+def video_dir(key: str) -> Path:
+    return VIDEO_CACHE_DIR / key
+
+
+def info_json_path(key: str) -> Path:
+    # Full yt-dlp info dict, fed back with --load-info-json so downloads skip extraction
+    return video_dir(key) / "info.json"
+
+
+def video_lock(key: str) -> threading.Lock:
+    # One download per video at a time; a second job for it waits and then reuses the file
+    with _locks_guard:
+        return _locks.setdefault(key, threading.Lock())
+
+
+def _write_json(path: Path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(f".tmp{os.getpid()}")
+    tmp.write_text(json.dumps(data), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def _probe(url: str):
+    res = run_child([YTDLP, "-J", "--no-playlist", url], "yt-dlp_probe")
+    if res.returncode != 0:
+        err = (res.stderr or "Unknown yt-dlp error")[:500]
+        raise RuntimeError(f"yt-dlp probe failed: {err}")
+    return json.loads(res.stdout)
+
+
+def _compact(info):
+    return {
+        "id": info["id"],
+        "key": _video_key(info),
+        "title": info.get("title") or "Project",
+        "duration": info.get("duration"),
+        "url": info.get("webpage_url"),
+        "formats": [{k: f.get(k) for k in _FORMAT_KEYS} for f in info.get("formats") or []],
+        "probed": time.time(),
+    }
+
+
+def probe_video(url: str, refresh: bool = False):
+    # id, title, duration and formats from one yt-dlp run, cached as JSON by _video_key()
+    ref = _url_ref(url)
+    if not refresh:
+        try:
+            key = ref.read_text(encoding="utf-8").strip()
+            meta = json.loads((video_dir(key) / "meta.json").read_text(encoding="utf-8"))
+            # Entries from before keys named the extractor are probed again
+            if "key" in meta:
+                return meta
+        except (FileNotFoundError, ValueError):
+            pass
+
+    t0 = time.perf_counter()
+    info = _probe(url)
+    meta = _compact(info)
+    _write_json(info_json_path(meta["key"]), info)
+    _write_json(video_dir(meta["key"]) / "meta.json", meta)
+    ref.parent.mkdir(parents=True, exist_ok=True)
+    ref.write_text(meta["key"], encoding="utf-8")
+    log(f"Probed {meta['key']} ({meta['duration'] or '?'}s) in {time.perf_counter() - t0:.1f}s")
+    return meta
+
+
+def source_args(url: str, meta):
+    # Stream URLs in the info dict expire after a few hours; an expired probe is redone
+    # and cached, so later downloads of the video load the fresh info.json again
+    if time.time() - meta["probed"] >= VIDEO_INFO_TTL or not info_json_path(meta["key"]).exists():
+        meta = probe_video(url, refresh=True)
+    return ["--load-info-json", str(info_json_path(meta["key"]))]
+
+
+def evict_media(max_bytes: int = VIDEO_CACHE_MAX_BYTES):
+    # Least recently used media files go first; metadata is tiny and stays
+    entries = []
+    for p in VIDEO_CACHE_DIR.glob("*/*"):
+        # Skip metadata, URL pointers and downloads still in progress
+        if p.suffix == ".json" or p.parent.name == "urls" or ".tmp" in p.name:
+            continue
+        try:
+            st = p.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((st.st_mtime, st.st_size, p))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, p in sorted(entries, key=lambda e: e[0]):
+        if total <= max_bytes:
+            break
+        # A held lock means a job is downloading or linking this entry right now
+        lock = video_lock(p.parent.name)
+        if not lock.acquire(blocking=False):
+            continue
+        try:
+            p.unlink(missing_ok=True)
+        finally:
+            lock.release()
+        total -= size
+
+
+if __name__ == "__main__":
+    # python -m clipgen.services.video_info URL
+    print(json.dumps(probe_video(sys.argv[1]), indent=2))
@@ -0,0 +1,61 @@
+import time
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Listener
+
+from clipgen.config import WORKER_AUTHKEY, WORKER_HOST, WORKER_PORT
+from clipgen.core.transcriber import _transcribe, load_whisper_model
+from clipgen.services.metrics import measured
+from clipgen.services.utils import log
+
+
+def _handle(req, stats):
+    if req.get("op") == "ping":
+        return {"ok": True, **stats}
+
+    stats["requests"] += 1
+    try:
+        # One request at a time, so this process's CPU and RSS are the request's
+        words, elapsed, cpu, rss = measured(_transcribe, req["path"], req.get("language", "auto"))
+    except Exception as e:
+        log(f"Worker: transcription failed: {e}")
+        return {"ok": False, "error": str(e)}
+
+    log(f"Worker: request #{stats['requests']} transcribed in {elapsed:.1f}s")
+    return {
+        "ok": True,
+        "words": words,
+        "transcribe_seconds": elapsed,
+        "cpu_seconds": cpu,
+        "peak_rss_bytes": rss,
+        **stats,
+    }
+
+
+def serve():
+    if WORKER_AUTHKEY is None:
+        raise SystemExit("CLIPGEN_WORKER_KEY is not set; the worker only runs with a key (app.py sets one)")
+
+    t0 = time.perf_counter()
+    load_whisper_model()
+    stats = {"requests": 0, "load_seconds": time.perf_counter() - t0}
+
+    with Listener((WORKER_HOST, WORKER_PORT), authkey=WORKER_AUTHKEY) as listener:
+        log(f"Whisper worker ready on {WORKER_HOST}:{WORKER_PORT} (cold start {stats['load_seconds']:.1f}s)")
+
+        while True:
+            try:
+                conn = listener.accept()
+            except (AuthenticationError, OSError) as e:
+                log(f"Worker: rejected connection ({e})")
+                continue
+
+            with conn:
+                try:
+                    conn.send(_handle(conn.recv(), stats))
+                except (EOFError, OSError):
+                    # Client went away mid-request; keep serving
+                    continue
+
+
+if __name__ == "__main__":
+    serve()
@@ -0,0 +1,63 @@
+# Local stand-in for yt-dlp in tests. Serves FAKE_YTDLP_FIXTURE to the -o path in small
+# steps, printing progress through --progress-template and resuming from <out>.part as
+# yt-dlp does. Each run appends the offset it started from to FAKE_YTDLP_LOG.
+#   FAKE_YTDLP_EXTRACT: seconds of silent "extraction" before the transfer starts
+#   FAKE_YTDLP_STEP: seconds between the ten steps of the transfer
+#   FAKE_YTDLP_STALL_AT: after this many bytes stop sending and hang (first run only,
+#   or every run with FAKE_YTDLP_STALL_ALWAYS set)
+import os
+import sys
+import time
+
+
+def main(argv):
+    out = argv[argv.index("-o") + 1]
+    # "download:<template>"; the fields are filled the way yt-dlp fills them
+    template = argv[argv.index("--progress-template") + 1].partition(":")[2]
+    with open(os.environ["FAKE_YTDLP_FIXTURE"], "rb") as f:
+        data = f.read()
+
+    part = out + ".part"
+    offset = os.path.getsize(part) if os.path.exists(part) else 0
+    if os.environ.get("FAKE_YTDLP_LOG"):
+        with open(os.environ["FAKE_YTDLP_LOG"], "a", encoding="utf-8") as f:
+            f.write(f"{offset}\n")
+
+    print("[generic] fake: Extracting URL", flush=True)
+    time.sleep(float(os.environ.get("FAKE_YTDLP_EXTRACT", "0")))
+
+    stall_at = int(os.environ.get("FAKE_YTDLP_STALL_AT", "-1"))
+    stall = stall_at >= 0 and (offset == 0 or "FAKE_YTDLP_STALL_ALWAYS" in os.environ)
+    step = max(1, len(data) // 10)
+
+    def tick(status, done):
+        fields = {
+            "progress.status": status,
+            "progress.downloaded_bytes": done,
+            "progress.total_bytes": len(data),
+            "progress.total_bytes_estimate": "NA",
+            "progress.speed": 1000.0,
+            "progress.eta": 3,
+        }
+        print(template % fields, flush=True)
+
+    done = offset
+    with open(part, "ab") as f:
+        while done < len(data):
+            if stall and done >= stall_at:
+                tick("downloading", done)
+                time.sleep(3600)
+            chunk = data[done:done + step]
+            f.write(chunk)
+            f.flush()
+            done += len(chunk)
+            tick("downloading", done)
+            time.sleep(float(os.environ.get("FAKE_YTDLP_STEP", "0.02")))
+
+    tick("finished", done)
+    os.replace(part, out)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,106 @@
+import numpy as np
+
+from clipgen.core.audio import SAMPLE_RATE
+from clipgen.core.chunking import CHUNK_OVERLAP, chunk_count, chunk_spans, split_points, stitch_chunks
+
+
+def _w(start, end, text):
+    return {"start": start, "end": end, "text": text}
+
+
+def _local(words, offset):
+    # Words as the chunk starting at `offset` reports them
+    return [_w(round(w["start"] - offset, 3), round(w["end"] - offset, 3), w["text"]) for w in words]
+
+
+def _timeline(words):
+    return [(w["start"], w["end"], w["text"]) for w in words]
+
+
+def test_chunk_count_fills_whole_rounds():
+    assert chunk_count(100, 4, 300) == 4
+    assert chunk_count(1000, 4, 300) == 4
+    assert chunk_count(1300, 4, 300) == 8
+    assert chunk_count(1300, 1, 300) == 5
+
+
+def test_chunk_spans_pad_audio_but_not_ownership():
+    n = 30 * SAMPLE_RATE
+    cuts = [0, 10 * SAMPLE_RATE, 20 * SAMPLE_RATE, n]
+    pad = int(CHUNK_OVERLAP * SAMPLE_RATE)
+
+    assert chunk_spans(cuts, n) == [
+        (0, 10 * SAMPLE_RATE + pad, 0.0, 10.0),
+        (10 * SAMPLE_RATE - pad, 20 * SAMPLE_RATE + pad, 10.0, 20.0),
+        (20 * SAMPLE_RATE - pad, n, 20.0, 30.0),
+    ]
+
+
+def test_split_points_land_in_silence():
+    # Tone everywhere except 0.5 s gaps at 9.0 s and 21.0 s
+    n = 30 * SAMPLE_RATE
+    audio = np.full(n, 0.5, dtype=np.float32)
+    gaps = [(9.0, 9.5), (21.0, 21.5)]
+    for a, b in gaps:
+        audio[int(a * SAMPLE_RATE):int(b * SAMPLE_RATE)] = 0.0
+
+    cuts = split_points(audio, 3)
+
+    assert cuts[0] == 0 and cuts[-1] == n
+    assert len(cuts) == 4
+    for cut, (a, b) in zip(cuts[1:-1], gaps):
+        assert a * SAMPLE_RATE <= cut < b * SAMPLE_RATE
+
+
+def test_stitch_drops_seam_word_heard_by_both_chunks():
+    source = [_w(8.0, 8.4, "the"), _w(9.7, 10.0, "cat"), _w(10.4, 10.8, "sat"), _w(12.0, 12.3, "down")]
+    # Cut at 10.0: the first chunk hears up to 11.0, the second from 9.0
+    first = source[:3]
+    # The second chunk times "cat" a little late, past the end of the first chunk's copy
+    second = [_w(9.72, 10.02, "cat"), _w(10.41, 10.8, "sat"), _w(12.0, 12.3, "down")]
+    chunks = [(0.0, 0.0, 10.0, _local(first, 0.0)), (9.0, 10.0, 20.0, _local(second, 9.0))]
+
+    assert _timeline(stitch_chunks(chunks)) == _timeline([source[0], source[1], _w(10.41, 10.8, "sat"), source[3]])
+
+
+def test_stitch_drops_late_timed_duplicate():
+    # Both copies of "cat" fall before the cut, the second one timed after the first ends
+    first = [_w(9.0, 9.4, "a"), _w(9.6, 9.9, "cat")]
+    second = [_w(9.95, 10.1, "cat"), _w(10.5, 10.9, "ran")]
+    chunks = [(0.0, 0.0, 10.0, _local(first, 0.0)), (9.0, 10.0, 20.0, _local(second, 9.0))]
+
+    assert [w["text"] for w in stitch_chunks(chunks)] == ["a", "cat", "ran"]
+
+
+def test_stitch_drops_word_clipped_at_padded_chunk_start():
+    source = [_w(9.1, 9.5, "sat"), _w(10.6, 11.0, "down")]
+    # Cut at 10.45: the second chunk starts at 9.45, inside "sat", and hears only its tail
+    second = [_w(9.45, 9.5, "t"), source[1]]
+    chunks = [(0.0, 0.0, 10.45, _local(source[:1], 0.0)), (9.45, 10.45, 20.0, _local(second, 9.45))]
+
+    assert _timeline(stitch_chunks(chunks)) == _timeline(source)
+
+
+def test_stitch_restores_source_timeline():
+    # Words every 0.6 s, cut at arbitrary points, so several words straddle a cut
+    source = [_w(round(0.2 + 0.6 * i, 3), round(0.6 + 0.6 * i, 3), f"w{i}") for i in range(100)]
+    n = int(61 * SAMPLE_RATE)
+    cuts = [0, int(14.5 * SAMPLE_RATE), int(30.05 * SAMPLE_RATE), int(45.3 * SAMPLE_RATE), n]
+
+    chunks = []
+    for a, b, lo, hi in chunk_spans(cuts, n):
+        t0, t1 = a / SAMPLE_RATE, b / SAMPLE_RATE
+        heard = []
+        for w in source:
+            if w["end"] <= t0 or w["start"] >= t1:
+                continue
+            # Words cut by the chunk edges come back as fragments
+            if w["start"] < t0 or w["end"] > t1:
+                heard.append(_w(max(w["start"], t0), min(w["end"], t1), "frag"))
+            else:
+                heard.append(w)
+        chunks.append((t0, lo, hi, _local(heard, t0)))
+
+    stitched = stitch_chunks(chunks)
+
+    assert _timeline(stitched) == _timeline(source)
@@ -0,0 +1,97 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+from clipgen.core import downloader
+from clipgen.services.status_service import bind_status
+
+FAKE_YTDLP = Path(__file__).with_name("fake_ytdlp.py")
+
+
+@pytest.fixture
+def fake(tmp_path, monkeypatch):
+    # yt-dlp replaced by tests/fake_ytdlp.py serving a fixture file; returns (fixture bytes, run log)
+    data = os.urandom(200_000)
+    fixture = tmp_path / "fixture.mp4"
+    fixture.write_bytes(data)
+    log = tmp_path / "runs.log"
+
+    launcher = tmp_path / "yt-dlp"
+    launcher.write_text(f'#!/bin/sh\nexec "{sys.executable}" "{FAKE_YTDLP}" "$@"\n', encoding="utf-8")
+    launcher.chmod(0o755)
+
+    monkeypatch.setattr(downloader, "YTDLP", str(launcher))
+    monkeypatch.setattr(downloader, "DOWNLOAD_STALL_TIMEOUT", 0.5)
+    monkeypatch.setenv("FAKE_YTDLP_FIXTURE", str(fixture))
+    monkeypatch.setenv("FAKE_YTDLP_LOG", str(log))
+    return data, log
+
+
+@pytest.fixture
+def statuses():
+    seen = []
+    bind_status(lambda message, progress, working: seen.append((message, progress)))
+    yield seen
+    bind_status(None)
+
+
+def _runs(log: Path):
+    # Offset each yt-dlp run started from
+    return [int(line) for line in log.read_text(encoding="utf-8").split()]
+
+
+def test_download_reports_progress(fake, statuses, tmp_path, monkeypatch):
+    data, log = fake
+    # Slow enough for a few status polls
+    monkeypatch.setenv("FAKE_YTDLP_STEP", "0.15")
+    out = downloader._yt_dlp(["https://example.com/v"], tmp_path / "video.mp4", "Laster ned...", progress=(10, 24))
+
+    assert out.read_bytes() == data
+    assert not Path(f"{out}.part").exists()
+    assert _runs(log) == [0]
+    assert statuses
+    for message, progress in statuses:
+        assert message.startswith("Laster ned... ")
+        assert message.endswith("% av 195.3 KB, 1000 B/s, 0:03 igjen")
+        assert 10 <= progress <= 24
+    assert [p for _, p in statuses] == sorted(p for _, p in statuses)
+
+
+def test_stalled_transfer_resumes_from_part(fake, statuses, tmp_path, monkeypatch):
+    data, log = fake
+    monkeypatch.setenv("FAKE_YTDLP_STALL_AT", str(len(data) // 2))
+
+    out = downloader._yt_dlp(["https://example.com/v"], tmp_path / "video.mp4")
+
+    assert out.read_bytes() == data
+    first, second = _runs(log)
+    assert first == 0
+    assert second >= len(data) // 2
+
+
+def test_stall_gives_up_after_retries(fake, statuses, tmp_path, monkeypatch):
+    data, log = fake
+    monkeypatch.setattr(downloader, "DOWNLOAD_RETRIES", 2)
+    monkeypatch.setenv("FAKE_YTDLP_STALL_AT", str(len(data) // 2))
+    monkeypatch.setenv("FAKE_YTDLP_STALL_ALWAYS", "1")
+    out = tmp_path / "video.mp4"
+
+    with pytest.raises(RuntimeError, match="download stalled"):
+        downloader._yt_dlp(["https://example.com/v"], out)
+
+    assert len(_runs(log)) == 2
+    assert not out.exists()
+    # Kept for the next attempt to resume
+    assert Path(f"{out}.part").stat().st_size >= len(data) // 2
+
+
+def test_silent_extraction_is_not_a_stall(fake, statuses, tmp_path, monkeypatch):
+    data, log = fake
+    monkeypatch.setenv("FAKE_YTDLP_EXTRACT", "1.5")
+
+    out = downloader._yt_dlp(["https://example.com/v"], tmp_path / "video.mp4")
+
+    assert out.read_bytes() == data
+    assert _runs(log) == [0]